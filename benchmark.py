@@ -0,0 +1,150 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import shutil
+import resource
+import tempfile
+import platform
+import argparse
+import subprocess
+import rdflib
+from synthetic import generate_ontology, generate_legacy_ontology, write_ontology
+from profiler import Profiler
+
+PIPELINES = ('generate', 'parse')
+SETTINGS = {"pot_exclude": [], "flat_definition": [], "vocabulary_prefix": "", "dli_include": []}
+
+
+def write_documents(documents):
+    files = 0
+    for path, text in documents:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        files += 1
+    return files
+
+
+def run_generate(filename, out_dir, timer):
+    from loader import load_ontology
+    from generate import prepare_graph, collect_classes, class_documents, document_paths, dump_json
+    with timer.phase('load'):
+        ontology = load_ontology(filename, cache=False)
+    with timer.phase('index'):
+        graph = prepare_graph(ontology.graph)
+        all_classes, top_classes = collect_classes(graph)
+    with timer.phase('render'):
+        rendered = [(x, class_documents(x, SETTINGS, ontology.defines, 'pot')) for x in all_classes]
+    with timer.phase('serialize'):
+        documents = []
+        for current_class, class_docs in rendered:
+            for kind, data in class_docs:
+                text = dump_json(data)
+                documents.extend((path, text) for path in document_paths(current_class, kind, out_dir))
+    with timer.phase('write'):
+        return write_documents(documents)
+
+
+def run_parse(filename, out_dir, timer):
+    from rdflib import Graph, URIRef, RDF
+    from inflection import underscore
+    from loader import load_ontology
+    from parse import Triplet, build_vocabulary, build_identity
+    from const import POT_BASE
+    with timer.phase('load'):
+        graph = load_ontology(filename, graph=Graph(), cache=False).graph
+    with timer.phase('index'):
+        class_triples = list(map(Triplet._make, graph.triples((None, RDF.type, URIRef('{}ontologies/pot.jsonld#Class'.format(POT_BASE))))))
+    with timer.phase('render'):
+        rendered = []
+        for class_triplet in class_triples:
+            vocabulary_dict, vocabulary, exclude = build_vocabulary(graph, class_triplet, excludes=[])
+            rendered.append((class_triplet, vocabulary_dict, build_identity(graph, class_triplet, vocabulary)))
+    with timer.phase('serialize'):
+        documents = []
+        for class_triplet, vocabulary_dict, identity_dict in rendered:
+            key = underscore(class_triplet.subject.split('#')[1])
+            documents.append((os.path.join(out_dir, 'identities', 'identity-{}.jsonld'.format(key)),
+                              json.dumps({'@context': identity_dict}, indent=4, separators=(',', ': '))))
+            documents.append((os.path.join(out_dir, 'vocabularies', '{}.jsonld'.format(key)),
+                              json.dumps(vocabulary_dict, indent=4, separators=(',', ': '))))
+    with timer.phase('write'):
+        return write_documents(documents)
+
+
+def run_point(pipeline, params):
+    """One measurement in this process: build the input, run every phase, report."""
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        filename = os.path.join(work_dir, 'pot.jsonld')
+        generate = generate_legacy_ontology if pipeline == 'parse' else generate_ontology
+        write_ontology(filename, generate(**params))
+        # A profiler of its own: only its phases are timed, the global PROFILER stays off.
+        timer = Profiler()
+        timer.enable()
+        run = run_parse if pipeline == 'parse' else run_generate
+        files = run(filename, os.path.join(work_dir, 'out'), timer)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    wall = sum(x['wall'] for x in timer.phases.values())
+    return {
+        'pipeline': pipeline,
+        'params': params,
+        'phases': timer.phases,
+        'wall': wall,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'files': files,
+        'files_per_sec': files / wall if wall else None,
+    }
+
+
+def run_sweep(pipelines, sizes, params):
+    """Run every (pipeline, size) point in a fresh interpreter so peak RSS is per point."""
+    runs = []
+    for pipeline in pipelines:
+        for size in sizes:
+            point = dict(params, classes=size)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--point', pipeline, json.dumps(point)],
+                                    check=True, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+            result = json.loads(output.stdout.decode('utf-8'))
+            print('{pipeline} classes={classes}: {wall:.2f}s, {files} files, {rss} MB'.format(
+                pipeline=pipeline, classes=size, wall=result['wall'], files=result['files'], rss=result['peak_rss_kb'] // 1024), file=sys.stderr)
+            runs.append(result)
+    return {
+        'python': platform.python_version(),
+        'rdflib': rdflib.__version__,
+        'platform': platform.platform(),
+        'runs': runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time generate.py and parse.py on synthetic ontologies of growing size.')
+    parser.add_argument('--sizes', default='100,500,1000', help='comma separated class counts')
+    parser.add_argument('--pipelines', default=','.join(PIPELINES), help='comma separated, any of ' + ', '.join(PIPELINES))
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--branching', type=int, default=4)
+    parser.add_argument('--properties', type=int, default=3, help='properties per class')
+    parser.add_argument('--multi-parent', type=float, default=0.05)
+    parser.add_argument('--languages', type=int, default=2)
+    parser.add_argument('--context-names', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='benchmark.json', help='results file')
+    parser.add_argument('--point', nargs=2, metavar=('PIPELINE', 'PARAMS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.point:
+        print(json.dumps(run_point(args.point[0], json.loads(args.point[1]))))
+        sys.exit()
+    params = {
+        'depth': args.depth,
+        'branching': args.branching,
+        'properties': args.properties,
+        'multi_parent': args.multi_parent,
+        'languages': args.languages,
+        'context_names': args.context_names,
+        'seed': args.seed,
+    }
+    results = run_sweep(args.pipelines.split(','), [int(x) for x in args.sizes.split(',')], params)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
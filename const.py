@@ -9,6 +9,11 @@ POT_EXPORT = 'https://standards.oftrust.net/v1/'
 DLI_BASE = 'https://digitalliving.github.io/standards/'
 DLI_EXPORT = 'https://standards.lifeengine.io/v1/'
 CONF_NAME = 'settings.conf'
+SNAPSHOT_DIR = '.snapshots'
+ONTOLOGY_CACHE_DIR = '.ontologies'
+DLI_ONTOLOGY_URL = '{}ontologies/dli.jsonld'.format(DLI_BASE)
+# Output documents of a class, in the order they are rendered.
+DOCUMENT_KINDS = ('Context', 'ClassDefinitions', 'Vocabulary')
 
 BASE_IDENTITY_POT = {
     '@version': VERSION,
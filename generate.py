@@ -1,21 +1,32 @@
 import os
-import sys
 import json
 import shutil
+import time
+import argparse
+import multiprocessing
+from collections import namedtuple
 from copy import deepcopy
-from rdflib import ConjunctiveGraph, RDF, RDFS, OWL, URIRef, BNode
-from utils import SW, POT, DLI, TripletTuple, uri2niceString
-from models import RDFClass, RDFProperty
+from rdflib import RDF, RDFS, OWL, URIRef, BNode
+from utils import SW, POT, DLI, TripletTuple, ResolvingNamespaceManager, clear_graph_caches
+from models import RDFClass, RDFProperty, build_type_ids, build_text_tables, build_property_sets, get_class_view, build_directories, forget_terms
+from hierarchy import build_hierarchy
+from store import TripleStore
+from profiler import PROFILER
+from sinks import FSYNC_POLICIES, DirectorySink, ZipSink, WriteBehindSink
+from githubify import RedirectingSink, RedirectStubs, RedirectMap, stub_writer
+from loader import load_ontology, clear_snapshots
+from incremental import Fingerprinter, Manifest, settings_fingerprint, remove_stale
 from const import BASE_DEFFINITION_POT, POT_BASE, BASE_IDENTITY_POT, BASE_VOCABULARY_POT,\
-     CONF_NAME, POT_EXPORT, BASE_DIRECTORY_POT, DLI_EXPORT
+     CONF_NAME, POT_EXPORT, BASE_DIRECTORY_POT, DLI_EXPORT, DOCUMENT_KINDS
 
 
 def create_deffinition_from_rdf_class(rdf_class, current_context):
     vocabulary_dict = deepcopy(BASE_DEFFINITION_POT)
+    type_id = get_class_view(rdf_class).type_id
     if current_context == 'pot':
-        vocabulary = '{}Vocabulary/{}'.format(POT_EXPORT, rdf_class.get_new_type_id()[4:])
+        vocabulary = '{}Vocabulary/{}'.format(POT_EXPORT, type_id[4:])
     else:
-        vocabulary = '{}Vocabulary/{}'.format(DLI_EXPORT, rdf_class.get_new_type_id()[4:])
+        vocabulary = '{}Vocabulary/{}'.format(DLI_EXPORT, type_id[4:])
     vocabulary_dict['@context']['@vocab'] = vocabulary
     vocabulary_dict['@id'] = vocabulary
     supported_class = rdf_class.toPython()
@@ -30,12 +41,12 @@ def create_deffinition_from_rdf_class(rdf_class, current_context):
             "dli:required": False,
         }
     }
-    total_attributes = rdf_class.get_properties()
+    total_attributes = get_class_view(rdf_class).properties
     languages_comments = set()
     for rdf_attribute in total_attributes:
-        supported_attrs[rdf_attribute.get_context_name(domain_selected=rdf_class)] = rdf_attribute.toVocab(parent_domain=rdf_class)
+        supported_attrs[rdf_attribute.context_name] = rdf_attribute.vocab_fragment()
 
-        for k, v in rdf_attribute.get_comments(comment_domain_selected=rdf_class).items():
+        for k, v in rdf_attribute.comments.items():
             languages_comments.add(k)
     if len(languages_comments):
         vocabulary_dict['@context']['description'] = {
@@ -58,61 +69,49 @@ def create_deffinition_from_rdf_class(rdf_class, current_context):
 
 def create_identity_from_rdf_class(rdf_class, flat_definition, current_context):
     identity_dict = deepcopy(BASE_IDENTITY_POT)
+    view = get_class_view(rdf_class)
+    type_id = view.type_id
     if current_context == 'pot':
-        vocabulary = '{}ClassDefinitions/{}'.format(POT_EXPORT, rdf_class.get_new_type_id()[4:])
-        identity_dict['@vocab'] = '{}Vocabulary/{}'.format(POT_EXPORT, rdf_class.get_new_type_id()[4:])
+        vocabulary = '{}ClassDefinitions/{}'.format(POT_EXPORT, type_id[4:])
+        identity_dict['@vocab'] = '{}Vocabulary/{}'.format(POT_EXPORT, type_id[4:])
     else:
-        vocabulary = '{}ClassDefinitions/{}'.format(DLI_EXPORT, rdf_class.get_new_type_id()[4:])
-        identity_dict['@vocab'] = '{}Vocabulary/{}'.format(DLI_EXPORT, rdf_class.get_new_type_id()[4:])
+        vocabulary = '{}ClassDefinitions/{}'.format(DLI_EXPORT, type_id[4:])
+        identity_dict['@vocab'] = '{}Vocabulary/{}'.format(DLI_EXPORT, type_id[4:])
     identity_dict['@classDefinition'] = vocabulary
-    total_attributes = set(rdf_class.get_properties())
+    total_attributes = view.properties
     for domain in total_attributes:
-        key = domain.get_context_name(domain_selected=rdf_class)
-        if uri2niceString(rdf_class.uriref, rdf_class.namespaces()) not in flat_definition:
+        key = domain.context_name
+        if str(rdf_class) not in flat_definition:
             identity_dict[key] = {
-                '@id':  domain.get_new_type_id(),
+                '@id':  domain.type_id,
             }
-            if domain.get_nested_at():
-                identity_dict[key]['@nest'] = domain.get_nested_at()
+            if domain.nested_at:
+                identity_dict[key]['@nest'] = domain.nested_at
         else:
-            identity_dict[key] = domain.get_new_type_id()
+            identity_dict[key] = domain.type_id
     return {
         '@context': identity_dict
     }
 
 
-def create_vocabulary_from_rdf_class(rdf_class, pot_json, current_onto):
+def create_vocabulary_from_rdf_class(rdf_class, defines, current_onto):
     vocabulary_dict = deepcopy(BASE_VOCABULARY_POT)
-    total_attributes = set(rdf_class.get_properties(only_context=current_onto))
+    view = get_class_view(rdf_class)
+    total_attributes = view.get_properties(only_context=current_onto)
     languages_labels = set()
     languages_comments = set()
     force_label = False
     force_comment = False
-    for d in pot_json.get('defines'):
-        if d.get('@id') == str(rdf_class):
-            new_dict = deepcopy(d)
-            if new_dict.get('dli:label'):
-                all_labels = {}
-                force_label = True
-                for i in new_dict.get('dli:label'):
-                    all_labels[i['rdfs:label']['@language']] = i['rdfs:label']['@value']
-                new_dict['rdfs:label'] = all_labels
-                del new_dict['dli:label']
-
-            if new_dict.get('dli:comment'):
-                all_labels = {}
-                force_comment = True
-                for i in new_dict.get('dli:comment'):
-                    all_labels[i['rdfs:comment']['@language']] = i['rdfs:comment']['@value']
-                new_dict['rdfs:comment'] = all_labels
-                del new_dict['dli:comment']
-
-            vocabulary_dict[rdf_class.title()] = new_dict
+    source = defines.get(str(rdf_class))
+    if source:
+        force_label = source.has_label
+        force_comment = source.has_comment
+        vocabulary_dict[rdf_class.title()] = source.entry
     for domain in total_attributes:
-        vocabulary_dict[domain.get_context_name(domain_selected=rdf_class)] = domain.toPython(parent_domain=rdf_class)
-        for k, v in domain.get_comments(comment_domain_selected=rdf_class).items():
+        vocabulary_dict[domain.context_name] = domain.python_fragment()
+        for k, v in domain.comments.items():
             languages_comments.add(k)
-        for k, v in domain.get_labels(label_domain_selected=rdf_class).items():
+        for k, v in domain.labels.items():
             languages_labels.add(k)
     if len(languages_labels) or force_label:
         vocabulary_dict['@context']['label'] = {
@@ -128,10 +127,11 @@ def create_vocabulary_from_rdf_class(rdf_class, pot_json, current_onto):
         }
     else:
         del vocabulary_dict['@context']['comment']
+    type_id = view.type_id
     for dependent in rdf_class.get_dependents():
         vocabulary_dict[dependent.title()] = {
             'rdfs:subClassOf': {
-                '@id': rdf_class.get_new_type_id()
+                '@id': type_id
             }
         }
     return vocabulary_dict
@@ -145,44 +145,154 @@ def create_identity_directory_from_rdf_class(top_classes, file_path):
     return identity_dict
 
 
-def build_directories(rdf_class):
-    parents = rdf_class.get_real_parents()
-    new_directories = []
-    if len(parents):
-        for i in rdf_class.get_real_parents():
-            directories = build_directories(i)
-            new_directories = []
-            for directory in directories:
-                new_directories.append(os.path.join(directory, rdf_class.title()))
-        return new_directories
-    else:
-        directories = [rdf_class.title(), ]
-    return directories
+class RenderedClass(namedtuple('RenderedClass', 'documents, directories')):
+    """
+    Rendered documents of a class as (paths, text) pairs, one pair per
+    document with every inheritance path it is written to, and the
+    directories to keep for the class's dependents.
+    """
 
+    def paths(self):
+        for paths, data in self.documents:
+            yield from paths
 
-def parse(filename):
-    with open(CONF_NAME, encoding='utf-8') as f:
-        data = f.read()
+
+def dump_json(data):
+    return json.dumps(data, indent=4, separators=(',', ': '), ensure_ascii=False)
+
+
+def class_document(current_class, kind, settings, defines, context_name):
+    """The kind document of current_class before serialization, None if settings exclude it."""
+    if kind == 'Vocabulary':
+        return create_vocabulary_from_rdf_class(current_class, defines, context_name)
+    if str(current_class) in settings.get('pot_exclude'):
+        return None
+    if kind == 'Context':
+        return create_identity_from_rdf_class(current_class, settings.get('flat_definition', []), context_name)
+    return create_deffinition_from_rdf_class(current_class, context_name)
+
+
+def class_documents(current_class, settings, defines, context_name):
+    """(kind, document) pairs of current_class, before serialization."""
+    documents = []
+    for kind in DOCUMENT_KINDS:
+        data = class_document(current_class, kind, settings, defines, context_name)
+        if data is not None:
+            documents.append((kind, data))
+    return documents
+
+
+def document_paths(current_class, kind, result_dir_name):
+    """Files a document of current_class is written to, one per inheritance path."""
+    return [os.path.normpath(os.path.join(result_dir_name, kind, directory, '..', '{}.jsonld'.format(current_class.title())))
+            for directory in build_directories(current_class)]
+
+
+def render_class(current_class, settings, defines, context_name, result_dir_name):
+    """
+    Render the documents of current_class once and map each of them to all of
+    the class's inheritance paths; nothing is written here.
+    """
+    started = time.perf_counter() if PROFILER.enabled else None
+    documents = []
+    directories = []
+    has_dependents = bool(current_class.get_dependents())
+    with PROFILER.phase('render'):
+        targets = class_documents(current_class, settings, defines, context_name)
+    for kind, data_to_dump in targets:
+        if has_dependents:
+            directories.extend(os.path.join(result_dir_name, kind, x) for x in build_directories(current_class))
+        with PROFILER.phase('serialize'):
+            data = dump_json(data_to_dump)
+        documents.append((document_paths(current_class, kind, result_dir_name), data))
+    if started is not None:
+        PROFILER.class_time(str(current_class), time.perf_counter() - started)
+    return RenderedClass(documents, directories)
+
+
+# Set by parse() before forking, so workers inherit the graph instead of unpickling it.
+_worker_state = None
+
+
+def _render_chunk(indices):
+    all_classes, settings, defines, context_name, result_dir_name = _worker_state
+    rendered = [render_class(all_classes[i], settings, defines, context_name, result_dir_name) for i in indices]
+    return rendered, PROFILER.take() if PROFILER.enabled else None
+
+
+def render_classes(all_classes, settings, defines, context_name, result_dir_name, jobs=1):
+    """
+    Yield RenderedClass results in all_classes order. With jobs > 1 the
+    classes are split into chunks rendered by forked worker processes.
+    """
+    global _worker_state
+    if jobs <= 1 or len(all_classes) < 2:
+        for current_class in all_classes:
+            yield render_class(current_class, settings, defines, context_name, result_dir_name)
+        return
+    chunk_size = max(1, len(all_classes) // (jobs * 4))
+    chunks = [range(i, min(i + chunk_size, len(all_classes))) for i in range(0, len(all_classes), chunk_size)]
+    _worker_state = (all_classes, settings, defines, context_name, result_dir_name)
     try:
-        settings = json.loads(data)
-    except (SyntaxError, json.decoder.JSONDecodeError):
-        print('Settings conf file syntax error')
-        exit()
+        # Workers start from a copy of this process's profile; reset drops it so merging counts nothing twice.
+        with multiprocessing.get_context('fork').Pool(jobs, initializer=PROFILER.reset) as pool:
+            for rendered_chunk, profile in pool.imap(_render_chunk, chunks):
+                if profile:
+                    PROFILER.merge(profile)
+                yield from rendered_chunk
+    finally:
+        _worker_state = None
 
-    with open(filename, encoding='utf-8') as f:
-        data = f.read()
-    context_name, file_extension = os.path.splitext(filename)
-    result_dir_name = os.path.join('newres', context_name)
-    pot_json = json.loads(data)
-    graph = ConjunctiveGraph().parse(data=data, format='json-ld')
+
+def prepare_graph(graph, compact=True, store=TripleStore):
+    """
+    Bind the output namespaces on a loaded graph and build the indexes the
+    renderers use. With compact, they are built over a read-only TripleStore
+    copy, made by store(graph), which is returned instead of graph; graph
+    itself is then left untouched.
+    """
+    if compact:
+        graph = store(graph)
+    else:
+        graph.namespace_manager = ResolvingNamespaceManager(graph)
     #graph.namespace_manager.bind('pot', POT_BASE + 'Classes/', replace=True)
     graph.namespace_manager.bind('pot', POT, replace=True)
     graph.namespace_manager.bind('dli', DLI, replace=True)
-    all_classes = []
+    PROFILER.instrument_graph(graph)
+    build_indexes(graph)
+    return graph
+
+
+def build_indexes(graph):
+    build_hierarchy(graph)
+    build_type_ids(graph)
+    build_text_tables(graph)
+    build_property_sets(graph)
+
+
+def update_graph(graph, touched, reshaped=True):
+    """
+    Bring the indexes of a graph from prepare_graph up to date after the
+    triples about the terms touched changed in place. Unless reshaped, the
+    change kept every type, parent and domain and the same set of terms, so
+    only what was derived from touched is read again.
+    """
+    if reshaped:
+        clear_graph_caches(graph)
+        build_indexes(graph)
+    else:
+        forget_terms(graph, touched)
+    return graph
+
+
+def collect_classes(graph):
+    """All classes of graph, and the ones without real parents."""
     all_iters = list(graph.triples((None, RDF.type, POT.Class)))
     all_iters.extend(list(graph.triples((None, RDF.type, DLI.Class))))
     all_iters.extend(list(graph.triples((None, RDF.type, RDFS.Class))))
     all_classes = []
+    # By IRI, so the render order (and the archive entry order) does not depend on the parse.
+    all_iters.sort(key=lambda x: str(x[0]))
     for triplet in map(TripletTuple._make, all_iters):
         rdf_class = RDFClass(triplet.subject, graph)
         all_classes.append(rdf_class)
@@ -190,53 +300,212 @@ def parse(filename):
     for current_class in all_classes:
         if not current_class.get_real_parents():
             top_classes.append(current_class)
-        for directory in build_directories(current_class):
-            if str(current_class) not in settings.get('pot_exclude'):
-                identity_dir = os.path.join(result_dir_name, 'Context', directory)
-                identiry_file_path = os.path.join(identity_dir, '..', '{}.jsonld'.format(current_class.title()))
-                os.makedirs(identity_dir, exist_ok=True)
-                data_to_dump = create_identity_from_rdf_class(current_class, settings.get('flat_definition', []), context_name)
-                with open(identiry_file_path, 'w', encoding='utf-8') as f:
-                    f.write(json.dumps(data_to_dump, indent=4, separators=(',', ': '), ensure_ascii=False))
-
-                if not current_class.get_dependents():
-                    os.rmdir(identity_dir)
-
-                deffinition_dir = os.path.join(result_dir_name, 'ClassDefinitions', directory)
-                deffinition_file_path = os.path.join(deffinition_dir, '..', '{}.jsonld'.format(current_class.title()))
-                os.makedirs(deffinition_dir, exist_ok=True)
-                data_to_dump = create_deffinition_from_rdf_class(current_class, context_name)
-                with open(deffinition_file_path, 'w', encoding='utf-8') as f:
-                    f.write(json.dumps(data_to_dump, indent=4, separators=(',', ': '), ensure_ascii=False))
-
-                if not current_class.get_dependents():
-                    os.rmdir(deffinition_dir)
-
-            vocabulary_dir = os.path.join(result_dir_name, 'Vocabulary', directory)
-            vocabulary_file_path = os.path.join(vocabulary_dir, '..', '{}.jsonld'.format(current_class.title()))
-            os.makedirs(vocabulary_dir, exist_ok=True)
-            data_to_dump = create_vocabulary_from_rdf_class(current_class, pot_json, context_name)
-            with open(vocabulary_file_path, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(data_to_dump, indent=4, separators=(',', ': '), ensure_ascii=False))
-
-            if not current_class.get_dependents():
-                os.rmdir(vocabulary_dir)
+    return all_classes, top_classes
+
+
+class Generator:
+    """
+    The documents generate.py writes, computed on demand and without
+    touching the filesystem. ontology is the path of an ontology file or an
+    already loaded rdflib graph (then pass defines, as from load_ontology,
+    for the source entries in vocabularies). settings is the parsed
+    settings.conf, by default no exclusions.
+
+    Every document is rendered on first use and, with memoize, kept for
+    later calls; the returned dicts are shared and must not be modified.
+    A graph passed in is left untouched: documents are rendered from a
+    TripleStore copy of it. Classes are given as RDFClass, prefixed name ('pot:Organization'),
+    IRI or title.
+    """
+
+    def __init__(self, ontology, settings=None, defines=None, context_name=None, memoize=True):
+        if isinstance(ontology, str):
+            context_name = context_name or os.path.splitext(ontology)[0]
+            loaded = load_ontology(ontology, cache=False)
+            graph, defines = loaded.graph, loaded.defines
+        else:
+            graph = ontology
+        self.context_name = context_name or 'pot'
+        self.settings = settings if settings is not None else {'pot_exclude': [], 'flat_definition': []}
+        self.defines = defines or {}
+        self.graph = prepare_graph(graph, compact=True)
+        all_classes, self.top_classes = collect_classes(self.graph)
+        self.classes = {}
+        self._names = {}
+        for current_class in all_classes:
+            self.classes.setdefault(str(current_class), current_class)
+            self._names.setdefault(str(current_class.uriref), current_class)
+            self._names.setdefault(current_class.title(), current_class)
+        self.memoize = memoize
+        self._documents = {}
+
+    def get_class(self, cls):
+        # An RDFClass may belong to the caller's graph; render the one of the copy.
+        name = str(cls.uriref) if isinstance(cls, RDFClass) else str(cls)
+        current_class = self.classes.get(name) or self._names.get(name)
+        if current_class is None:
+            raise KeyError(name)
+        return current_class
+
+    def document(self, kind, cls):
+        """The kind (see DOCUMENT_KINDS) document of cls, None if settings exclude it."""
+        current_class = self.get_class(cls)
+        key = (kind, str(current_class))
+        try:
+            return self._documents[key]
+        except KeyError:
+            pass
+        data = class_document(current_class, kind, self.settings, self.defines, self.context_name)
+        if self.memoize:
+            self._documents[key] = data
+        return data
+
+    def identity(self, cls):
+        return self.document('Context', cls)
+
+    def definition(self, cls):
+        return self.document('ClassDefinitions', cls)
+
+    def vocabulary(self, cls):
+        return self.document('Vocabulary', cls)
+
+    def directory(self):
+        """The top-level Vocabulary.jsonld listing the classes without parents."""
+        try:
+            return self._documents['directory']
+        except KeyError:
+            pass
+        data = create_identity_directory_from_rdf_class(self.top_classes, None)
+        if self.memoize:
+            self._documents['directory'] = data
+        return data
+
+    def directory_path(self):
+        return '{}/Vocabulary.jsonld'.format(self.context_name)
+
+    def paths(self):
+        """(path, kind, class) for every document path below newres, in generation order."""
+        for current_class in self.classes.values():
+            for kind in DOCUMENT_KINDS:
+                for file_path in document_paths(current_class, kind, self.context_name):
+                    yield file_path.replace(os.sep, '/'), kind, current_class
+
+    def iter_documents(self):
+        """
+        (path, document) for every file generate.py writes below newres,
+        rendering each document when it is reached.
+        """
+        for file_path, kind, current_class in self.paths():
+            data = self.document(kind, current_class)
+            if data is not None:
+                yield file_path, data
+        yield self.directory_path(), self.directory()
+
+
+def parse(filename, jobs=1, incremental=False, cache=True, link=None, compact=True, sink=None):
+    with open(CONF_NAME, encoding='utf-8') as f:
+        data = f.read()
+    try:
+        settings = json.loads(data)
+    except (SyntaxError, json.decoder.JSONDecodeError):
+        print('Settings conf file syntax error')
+        exit()
+
+    context_name, file_extension = os.path.splitext(filename)
+    result_dir_name = os.path.join('newres', context_name)
+    with PROFILER.phase('load'):
+        ontology = load_ontology(filename, cache=cache)
+    defines = ontology.defines
+    with PROFILER.phase('index'):
+        graph = prepare_graph(ontology.graph, compact=compact)
+        # Nothing below modifies the graph, so with compact the rdflib copy is released.
+        ontology = None
+        all_classes, top_classes = collect_classes(graph)
+    classes_to_render = all_classes
+    if sink is None:
+        sink = DirectorySink(link=link)
+    if incremental:
+        old_manifest = Manifest.load(result_dir_name + '.manifest.json')
+        settings_fp = settings_fingerprint(settings, graph)
+        new_manifest = Manifest(old_manifest.path, settings_fp)
+        fingerprinter = Fingerprinter(graph, defines, settings_fp)
+        fingerprints = {}
+        classes_to_render = []
+        with PROFILER.phase('fingerprint'):
+            for current_class in all_classes:
+                name = str(current_class)
+                if name in fingerprints:
+                    continue
+                fingerprints[name] = fingerprinter.fingerprint(current_class)
+                if old_manifest.settings == settings_fp and old_manifest.is_fresh(name, fingerprints[name]):
+                    new_manifest.classes[name] = old_manifest.classes[name]
+                    sink.keep(new_manifest.classes[name]['files'], new_manifest.classes[name]['directories'])
+                else:
+                    classes_to_render.append(current_class)
+    rendered_classes = render_classes(classes_to_render, settings, defines, context_name, result_dir_name, jobs=jobs)
+    for current_class, rendered in zip(classes_to_render, rendered_classes):
+        with PROFILER.phase('write'):
+            sink.write_rendered(rendered)
+        if incremental:
+            new_manifest.update(str(current_class), fingerprints[str(current_class)], rendered)
+    if incremental:
+        with PROFILER.phase('write'):
+            # Pending writes may still create directories remove_stale prunes.
+            sink.flush()
+            remove_stale(old_manifest, new_manifest, result_dir_name, stale=sink.stale)
+            new_manifest.save()
 
     context_file_path = os.path.join(result_dir_name, 'Vocabulary.jsonld')
     data_to_dump = create_identity_directory_from_rdf_class(top_classes, context_file_path)
-    with open(context_file_path, 'w', encoding='utf-8') as f:
-        f.write(json.dumps(data_to_dump, indent=4, separators=(',', ': '), ensure_ascii=False))
+    with PROFILER.phase('write'):
+        sink.write(context_file_path, dump_json(data_to_dump))
+        sink.flush()
+    if PROFILER.enabled:
+        PROFILER.extra['classes'] = len(all_classes)
+        PROFILER.extra['jobs'] = jobs
+        lookups = PROFILER.counters['fragments.hit'] + PROFILER.counters['models.PropertyView']
+        PROFILER.extra['fragment_hit_rate'] = PROFILER.counters['fragments.hit'] / lookups if lookups else 0.0
+
 
 if __name__ == "__main__":
-    try:
-        filename = sys.argv[1]
-    except IndexError:
-        print('You have to select file to parse, please use: python parse.py <filename.jsonld>')
-        exit()
-    parse(filename)
-    try:
-        archive = sys.argv[2]
-        if archive == '-a':
-            shutil.make_archive('generated', 'zip', 'newres')
-    except:
-        pass
+    parser = argparse.ArgumentParser(description='Generate Context, ClassDefinitions and Vocabulary documents.')
+    parser.add_argument('filename', help='ontology to parse, e.g. pot.jsonld')
+    parser.add_argument('-a', dest='archive', action='store_true', help='write the documents straight into generated.zip instead of newres')
+    parser.add_argument('--archive-tree', action='store_true', help='with -a, write newres as well and pack it into generated.zip afterwards')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes used for rendering')
+    parser.add_argument('-i', '--incremental', action='store_true', help='only rewrite documents of classes changed since the last run')
+    parser.add_argument('--link', choices=('hardlink', 'symlink'), help='link documents of classes with several parents instead of writing copies')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='parse the input even if a snapshot of it exists')
+    parser.add_argument('--rdflib-graph', dest='compact', action='store_false', help='query the rdflib graph directly instead of a compact read-only copy')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all parsed-graph snapshots first')
+    parser.add_argument('--redirects', metavar='ROOT_URL', help='write the githubify.py redirect stubs for newres, published under ROOT_URL, while generating')
+    parser.add_argument('--redirect-map', metavar='PATH', help='with --redirects, write one redirect map (JSON, or _redirects lines if PATH is named _redirects) instead of stubs')
+    parser.add_argument('--write-threads', type=int, default=0, help='write documents from N background threads while rendering goes on (0 writes them in turn)')
+    parser.add_argument('--write-queue', type=int, default=256, help='with --write-threads, the most documents waiting to be written before rendering blocks')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='never', help='fsync the written files and their directories after every write or once at the end (for -a, the archive)')
+    parser.add_argument('--profile', metavar='PATH', help="write phase timings, counters and the slowest classes as JSON to PATH ('-' for stderr)")
+    args = parser.parse_args()
+    if args.incremental and args.archive and not args.archive_tree:
+        parser.error('--incremental needs the newres tree, use it with -a --archive-tree')
+    if args.profile:
+        PROFILER.enable()
+    if args.clear_cache:
+        clear_snapshots()
+    with PROFILER.phase('total'):
+        if args.archive and not args.archive_tree:
+            sink = ZipSink('generated.zip', 'newres', fsync=args.fsync)
+        else:
+            sink = DirectorySink(link=args.link, fsync=args.fsync)
+        if args.write_threads > 0:
+            # One thread keeps the entry order of an archive.
+            sink = WriteBehindSink(sink, workers=1 if isinstance(sink, ZipSink) else args.write_threads, max_pending=args.write_queue)
+        if args.redirects:
+            redirects = RedirectMap(args.redirects, args.redirect_map) if args.redirect_map else RedirectStubs(args.redirects, stub_writer(sink, 'newres'))
+            sink = RedirectingSink(sink, 'newres', redirects)
+        with sink:
+            parse(args.filename, jobs=args.jobs, incremental=args.incremental, cache=args.cache, compact=args.compact, sink=sink)
+        if args.archive and args.archive_tree:
+            with PROFILER.phase('archive'):
+                shutil.make_archive('generated', 'zip', 'newres')
+    if args.profile:
+        PROFILER.write_report(args.profile)
@@ -1,5 +1,7 @@
 import os
-import sys
+import json
+import argparse
+import posixpath
 from string import Template
 
 EXCLUDE_INDEXES = ('Context', 'ClassDefinitions', 'Ontology')
@@ -8,19 +10,192 @@ redirect_to: "$redirect_to"
 ---
 ''')
 
-if __name__ == "__main__": 
-    root_name = sys.argv[1]
-    for (root,dirs,files) in os.walk(".", topdown=True):
+
+def write_stub(file_path, data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as f:
+        f.write(data)
+
+
+class RedirectStubs:
+    """
+    The GitHub Pages layout: for every document name.jsonld a name.md and a
+    name/index.md redirecting to it, and an index.md in every directory
+    redirecting to the document of the same name one level up.
+    Paths are relative to the tree root and start with '.', as os.walk('.')
+    yields them.
+    """
+
+    def __init__(self, root_name, write=write_stub):
+        self.root_name = root_name
+        self._write = write
+        self.written = set()
+
+    def write(self, file_path, data):
+        self.written.add(os.path.normpath(file_path))
+        self._write(file_path, data)
+
+    def directory(self, root):
+        dir_name = os.path.split(root)[-1]
+        self.write(os.path.join(root, 'index.md'),
+                   FILE_REDIRECT_TEMPLATE.substitute(redirect_to=os.path.join(self.root_name, root, '..', dir_name+'.jsonld')))
+
+    def file(self, root, fname):
+        data = FILE_REDIRECT_TEMPLATE.substitute(redirect_to=os.path.join(self.root_name, root, fname+'.jsonld'))
+        self.write(os.path.join(root, fname+'.md'), data)
+        self.write(os.path.join(root, fname, 'index.md'), data)
+
+    def stale(self, root, fname=None):
+        """Stubs of the directory root, or of its document fname, not written since this object was made."""
+        if fname is None:
+            paths = [os.path.join(root, 'index.md')]
+        else:
+            paths = [os.path.join(root, fname+'.md'), os.path.join(root, fname, 'index.md')]
+        return [x for x in paths if os.path.normpath(x) not in self.written]
+
+    def close(self):
+        pass
+
+
+class RedirectMap:
+    """
+    The same redirects as one file instead of stubs: a JSON object of
+    source path to target URL, or, when path is named _redirects, one
+    'source target 301' line per redirect.
+    """
+
+    def __init__(self, root_name, path):
+        self.root_name = root_name.rstrip('/')
+        self.path = path
+        self.redirects = {}
+
+    def url(self, path):
+        path = posixpath.normpath(path.replace(os.sep, '/'))
+        return '' if path == '.' else path
+
+    def add(self, source, target):
+        self.redirects['/' + self.url(source)] = '{}/{}'.format(self.root_name, self.url(target))
+
+    def directory(self, root):
+        if not self.url(root):  # the stubs' index.md of the root points outside the tree
+            return
+        self.add(root, os.path.join(root, '..', os.path.split(root)[-1]+'.jsonld'))
+
+    def file(self, root, fname):
+        self.add(os.path.join(root, fname), os.path.join(root, fname+'.jsonld'))
+
+    def stale(self, root, fname=None):
+        # The map is written whole on close, so it never holds a stale entry.
+        return []
+
+    def close(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            if os.path.basename(self.path) == '_redirects':
+                for source in sorted(self.redirects):
+                    f.write('{} {} 301\n'.format(source, self.redirects[source]))
+            else:
+                json.dump(self.redirects, f, indent=1, sort_keys=True)
+
+
+def walk(redirects, top='.'):
+    """Emit the redirects of the tree below top, which must be the current directory for stubs."""
+    for (root,dirs,files) in os.walk(top, topdown=True):
         dir_name = os.path.split(root)[-1]
         if dir_name != '' and dir_name not in EXCLUDE_INDEXES:
-                with open(os.path.join(root, 'index.md'), 'w') as f:
-                    f.write(FILE_REDIRECT_TEMPLATE.substitute(redirect_to=os.path.join(root_name, root, '..', dir_name+'.jsonld')))
+            redirects.directory(root)
 
         file_names = map(lambda x: os.path.splitext(x)[0], files)
         for fname in file_names:
             if fname not in dirs and fname != 'index':
-                with open(os.path.join(root, fname+'.md'), 'w') as f:
-                    f.write(FILE_REDIRECT_TEMPLATE.substitute(redirect_to=os.path.join(root_name, root, fname+'.jsonld')))
-                os.makedirs(os.path.join(root, fname), exist_ok=True)
-                with open(os.path.join(root, fname, 'index.md'), 'w') as f:
-                    f.write(FILE_REDIRECT_TEMPLATE.substitute(redirect_to=os.path.join(root_name, root, fname+'.jsonld')))
\ No newline at end of file
+                redirects.file(root, fname)
+    redirects.close()
+
+
+class RedirectingSink:
+    """
+    Output sink wrapper that emits the redirects of every document as the
+    generator writes it, so the tree never has to be walked afterwards.
+    Stubs are written through the wrapped sink, so they also end up in an
+    archive. root is the directory the redirects are relative to.
+    Documents an incremental run keeps get their redirects through keep(),
+    and stale() names the stubs to delete along with a stale document.
+    """
+
+    def __init__(self, sink, root, redirects):
+        self.sink = sink
+        self.root = root
+        self.redirects = redirects
+        self.directories = set()
+
+    def add_directory(self, rel_dir):
+        rel_dir = rel_dir or '.'
+        if rel_dir in self.directories:
+            return
+        if rel_dir != '.':
+            self.add_directory(os.path.dirname(rel_dir))
+        self.directories.add(rel_dir)
+        if os.path.basename(rel_dir) not in EXCLUDE_INDEXES:
+            self.redirects.directory('.' if rel_dir == '.' else os.path.join('.', rel_dir))
+
+    def emit(self, file_path):
+        rel_dir, name = os.path.split(os.path.relpath(file_path, self.root))
+        self.add_directory(rel_dir)
+        fname = os.path.splitext(name)[0]
+        if os.path.join(rel_dir, fname) not in self.directories and fname != 'index':
+            self.redirects.file(os.path.join('.', rel_dir) if rel_dir else '.', fname)
+
+    def write(self, file_path, data):
+        self.sink.write(file_path, data)
+        self.emit(file_path)
+
+    def keep(self, file_paths, directories):
+        for directory in directories:
+            self.add_directory(os.path.relpath(directory, self.root))
+        for file_path in file_paths:
+            self.emit(file_path)
+        self.sink.keep(file_paths, directories)
+
+    def stale(self, path, directory=False):
+        rel_path = os.path.relpath(path, self.root)
+        if directory:
+            stubs = self.redirects.stale(os.path.join('.', rel_path))
+        else:
+            rel_dir, name = os.path.split(rel_path)
+            stubs = self.redirects.stale(os.path.join('.', rel_dir) if rel_dir else '.', os.path.splitext(name)[0])
+        return [os.path.normpath(os.path.join(self.root, x)) for x in stubs] + self.sink.stale(path, directory)
+
+    def write_rendered(self, rendered):
+        for directory in rendered.directories:
+            self.add_directory(os.path.relpath(directory, self.root))
+        self.sink.write_rendered(rendered)
+        for paths, data in rendered.documents:
+            for file_path in paths:
+                self.emit(file_path)
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self.redirects.close()
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.redirects.close()
+        self.sink.__exit__(exc_type, exc, tb)
+
+
+def stub_writer(sink, root):
+    """write() for RedirectStubs that puts the stubs below root through sink."""
+    return lambda file_path, data: sink.write(os.path.normpath(os.path.join(root, file_path)), data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write redirects to the .jsonld documents of the tree in the current directory.')
+    parser.add_argument('root_name', help='URL the tree is published under')
+    parser.add_argument('--map', metavar='PATH', help='write one redirect map (JSON, or _redirects lines if PATH is named _redirects) instead of stub files')
+    args = parser.parse_args()
+    walk(RedirectMap(args.root_name, args.map) if args.map else RedirectStubs(args.root_name))
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from rdflib import RDFS
+from utils import GraphCache
+
+_indexes = GraphCache()
+
+
+class HierarchyIndex:
+    """
+    Subclass DAG of a graph with ancestor/descendant closures and depth
+    precomputed, so models never walk rdfs:subClassOf through the graph.
+
+    Ancestors keep the breadth-first order the old walks used.
+    Self references (X subClassOf X) are not part of the DAG.
+    """
+
+    def __init__(self, graph, predicate=RDFS.subClassOf):
+        self.parents = OrderedDict()
+        self.children = OrderedDict()
+        for subject, _, parent in graph.triples((None, predicate, None)):
+            if subject == parent:
+                continue
+            parents = self.parents.setdefault(subject, [])
+            if parent not in parents:
+                parents.append(parent)
+                self.children.setdefault(parent, []).append(subject)
+        self._ancestors = {}
+        self._ancestor_sets = {}
+        self._descendants = {}
+        self._depth = {}
+        for node in self.nodes():
+            self.ancestors(node)
+            self.descendants(node)
+            self.depth(node)
+
+    def nodes(self):
+        nodes = OrderedDict()
+        for subject, parents in self.parents.items():
+            nodes[subject] = None
+            for parent in parents:
+                nodes[parent] = None
+        return list(nodes)
+
+    def get_parents(self, uriref):
+        return tuple(self.parents.get(uriref, ()))
+
+    def get_children(self, uriref):
+        return tuple(self.children.get(uriref, ()))
+
+    def ancestors(self, uriref):
+        try:
+            return self._ancestors[uriref]
+        except KeyError:
+            pass
+        result = self._ancestors[uriref] = self._closure(uriref, self.parents)
+        return result
+
+    def ancestor_set(self, uriref):
+        try:
+            return self._ancestor_sets[uriref]
+        except KeyError:
+            pass
+        result = self._ancestor_sets[uriref] = frozenset(self.ancestors(uriref))
+        return result
+
+    def descendants(self, uriref):
+        try:
+            return self._descendants[uriref]
+        except KeyError:
+            pass
+        result = self._descendants[uriref] = self._closure(uriref, self.children)
+        return result
+
+    def is_ancestor(self, ancestor, uriref):
+        return ancestor in self.ancestor_set(uriref)
+
+    def depth(self, uriref, _visiting=None):
+        """Length of the longest subclass chain from uriref up to a root."""
+        try:
+            return self._depth[uriref]
+        except KeyError:
+            pass
+        visiting = _visiting or set()
+        visiting.add(uriref)
+        depth = 0
+        for parent in self.parents.get(uriref, []):
+            if parent in visiting:
+                continue
+            depth = max(depth, self.depth(parent, visiting) + 1)
+        visiting.discard(uriref)
+        self._depth[uriref] = depth
+        return depth
+
+    def topological_order(self):
+        """All nodes, each one after all of its parents."""
+        return sorted(self.nodes(), key=self.depth)
+
+    @staticmethod
+    def _closure(uriref, edges):
+        result = OrderedDict()
+        level = edges.get(uriref, [])
+        while level:
+            next_level = []
+            for node in level:
+                if node == uriref or node in result:
+                    continue
+                result[node] = None
+                next_level.extend(edges.get(node, []))
+            level = next_level
+        return tuple(result)
+
+
+def build_hierarchy(graph):
+    index = _indexes[graph] = HierarchyIndex(graph)
+    return index
+
+
+def get_hierarchy(graph):
+    try:
+        return _indexes[graph]
+    except KeyError:
+        return build_hierarchy(graph)
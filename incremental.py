@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+from rdflib import BNode
+from hierarchy import get_hierarchy
+from models import get_type_ids, get_property_sets, build_directories
+
+MANIFEST_VERSION = 1
+
+
+def term_lines(graph, term, _seen=None):
+    """
+    Sorted N3 lines of everything said about term. Blank nodes are inlined by
+    content, so the lines do not depend on the random BNode ids of a parse.
+    """
+    seen = _seen or set()
+    seen.add(term)
+    lines = []
+    for _, predicate, obj in graph.triples((term, None, None)):
+        if isinstance(obj, BNode):
+            if obj in seen:
+                continue
+            obj_text = '[{}]'.format(' ; '.join(term_lines(graph, obj, seen)))
+        else:
+            obj_text = obj.n3()
+        lines.append('{} {}'.format(predicate.n3(), obj_text))
+    return sorted(lines)
+
+
+class Fingerprinter:
+    """
+    Digest of everything a class's Context/ClassDefinitions/Vocabulary
+    documents are rendered from: the class with its type id and directories,
+    its ancestors, its children, the properties in its domain (with their
+    label, comment and context name nodes) and the class's entries in the
+    source document.
+    """
+
+    def __init__(self, graph, defines, settings_fingerprint, digests=None):
+        self.graph = graph
+        self.settings_fingerprint = settings_fingerprint
+        self.defines = defines
+        # Term digests of an earlier graph may be passed in, less the terms changed since.
+        self._digests = digests if digests is not None else {}
+
+    def term_digest(self, uriref):
+        try:
+            return self._digests[uriref]
+        except KeyError:
+            pass
+        digest = self._digests[uriref] = hashlib.sha1('\n'.join(term_lines(self.graph, uriref)).encode('utf-8')).hexdigest()
+        return digest
+
+    def fingerprint(self, rdf_class):
+        type_ids = get_type_ids(self.graph)
+        parts = [self.settings_fingerprint, str(rdf_class), self.term_digest(rdf_class.uriref), type_ids.type_id(rdf_class)]
+        # Everything in IRI order: the hierarchy and the graph iterate in an order that changes between processes.
+        parts.extend(sorted(build_directories(rdf_class)))
+        source = self.defines.get(str(rdf_class))
+        if source:
+            parts.append(json.dumps(source, sort_keys=True))
+        for ancestor in sorted(get_hierarchy(self.graph).ancestors(rdf_class.uriref)):
+            parts.extend((ancestor, self.term_digest(ancestor)))
+        for child in sorted(rdf_class.get_children(), key=lambda x: x.uriref):
+            parts.extend((child.uriref, child.title()))
+        for rdf_property in rdf_class.get_properties():
+            parts.extend((rdf_property.uriref, self.term_digest(rdf_property.uriref), type_ids.type_id(rdf_property)))
+            parts.extend(sorted(type_ids.type_id(x) for x in rdf_property.get_supported_range()))
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def depends_on(self, rdf_class, urirefs):
+        """
+        Whether the fingerprint of rdf_class reads the triples of any of
+        urirefs (a set), given that no type, parent or domain changed.
+        """
+        if rdf_class.uriref in urirefs:
+            return True
+        if not urirefs.isdisjoint(get_hierarchy(self.graph).ancestors(rdf_class.uriref)):
+            return True
+        return not urirefs.isdisjoint(get_property_sets(self.graph).resolve(rdf_class.uriref))
+
+
+def settings_fingerprint(settings, graph):
+    data = {
+        'version': MANIFEST_VERSION,
+        'settings': settings,
+        'namespaces': sorted([prefix, str(namespace)] for prefix, namespace in graph.namespaces()),
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """
+    Record of the last generation run kept next to the output tree: the
+    settings fingerprint and, per class, its fingerprint and the files and
+    directories it produced.
+    """
+
+    def __init__(self, path, settings=None, classes=None):
+        self.path = path
+        self.settings = settings
+        self.classes = classes or {}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get('settings'), data.get('classes'))
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'settings': self.settings, 'classes': self.classes}, f, indent=1, sort_keys=True)
+
+    def is_fresh(self, name, fingerprint):
+        entry = self.classes.get(name)
+        if not entry or entry['fingerprint'] != fingerprint:
+            return False
+        return all(os.path.isfile(x) for x in entry['files'])
+
+    def update(self, name, fingerprint, rendered):
+        self.classes[name] = {
+            'fingerprint': fingerprint,
+            'files': sorted(set(rendered.paths())),
+            'directories': sorted(set(os.path.normpath(x) for x in rendered.directories)),
+        }
+
+    def outputs(self):
+        files, directories = set(), set()
+        for entry in self.classes.values():
+            files.update(entry['files'])
+            directories.update(entry['directories'])
+        return files, directories
+
+
+def remove_stale(old_manifest, new_manifest, root, stale=None):
+    """
+    Delete files the old run produced that the new one does not, then prune
+    directories left empty below root. stale(path, directory) names further
+    files that go along with a deleted file or directory, e.g. the sink's
+    redirect stubs.
+    """
+    old_files, old_directories = old_manifest.outputs()
+    new_files, new_directories = new_manifest.outputs()
+    candidates = set(old_directories - new_directories)
+    for path in sorted(old_files - new_files):
+        for file_path in [path] + (stale(path, False) if stale else []):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+            candidates.add(os.path.dirname(file_path))
+    root = os.path.normpath(root)
+    for directory in sorted(candidates, key=len, reverse=True):
+        directory = os.path.normpath(directory)
+        while directory.startswith(root + os.sep) and directory not in new_directories:
+            for file_path in stale(directory, True) if stale else []:
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
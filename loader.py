@@ -0,0 +1,401 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+import hashlib
+import tempfile
+import urllib.error
+import urllib.request
+from array import array
+from collections import namedtuple
+from copy import deepcopy
+import rdflib
+import rdflib_jsonld
+from rdflib import ConjunctiveGraph, URIRef, BNode, Literal, RDF, XSD
+from rdflib_jsonld.context import Context
+from rdflib_jsonld.parser import to_rdf
+from rdflib_jsonld.util import VOCAB_DELIMS
+
+from const import SNAPSHOT_DIR, ONTOLOGY_CACHE_DIR
+
+LoadedOntology = namedtuple('LoadedOntology', 'graph, document, defines')
+SourceEntry = namedtuple('SourceEntry', 'entry, has_label, has_comment')
+SNAPSHOT_VERSION = 1
+
+# Context entries and node keys the direct loader understands; anything else
+# goes through the generic rdflib-jsonld parser.
+TERM_KEYS = {'@id', '@type', '@reverse'}
+CONTEXT_KEYWORDS = {'@vocab', '@base', '@language'}
+VALUE_KEYS = {'@value', '@language', '@type'}
+NODE_KEYWORDS = {'@id', '@type'}
+
+
+class UnsupportedDocument(Exception):
+    pass
+
+
+class DirectLoader:
+    """
+    Converts the vocabulary's JSON-LD shape (one inline @context of plain
+    prefixes and @id/@type/@reverse terms, nested node and value objects)
+    straight into triples, with every key and IRI expanded once.
+    Expansion itself is delegated to rdflib-jsonld's Context, so IRIs come
+    out exactly as the generic parser produces them.
+    """
+
+    def __init__(self, document, base):
+        local_context = document.get('@context') if isinstance(document, dict) else None
+        if not isinstance(local_context, dict) or CONTEXT_KEYWORDS & set(local_context):
+            raise UnsupportedDocument('only a single inline @context is supported')
+        for definition in local_context.values():
+            if isinstance(definition, dict):
+                if set(definition) - TERM_KEYS or definition.get('@type', '@id') != '@id':
+                    raise UnsupportedDocument('unsupported term definition {}'.format(definition))
+            elif not isinstance(definition, str):
+                raise UnsupportedDocument('unsupported term definition {}'.format(definition))
+        self.document = document
+        self.context = Context(base=base)
+        self.context.load(local_context, self.context.base)
+        self.triples = []
+        self._predicates = {}
+        self._ids = {}
+        self._types = {}
+
+    def namespaces(self):
+        for name, term in list(self.context.terms.items()):
+            if term.id and term.id.endswith(VOCAB_DELIMS):
+                yield name, term.id
+
+    def load(self):
+        node = dict(self.document)
+        del node['@context']
+        self.node(node)
+        return self.triples
+
+    def resolve_id(self, value):
+        try:
+            return self._ids[value]
+        except KeyError:
+            pass
+        if not isinstance(value, str):
+            raise UnsupportedDocument('non string @id {!r}'.format(value))
+        if value.startswith('_:'):
+            resolved = BNode(value[2:]) if value[2:] else None
+        else:
+            uri = self.context.resolve(value)
+            resolved = URIRef(uri) if ':' in uri else None
+        self._ids[value] = resolved
+        return resolved
+
+    def resolve_type(self, value):
+        try:
+            return self._types[value]
+        except KeyError:
+            pass
+        if not isinstance(value, str):
+            raise UnsupportedDocument('non string @type {!r}'.format(value))
+        resolved = self._types[value] = self.resolve_id(self.context.expand(value) or self.context.resolve_iri(value))
+        return resolved
+
+    def predicate(self, key):
+        try:
+            return self._predicates[key]
+        except KeyError:
+            pass
+        term = self.context.terms.get(key)
+        uri = term.id if term else self.context.expand(key)
+        if uri and uri.startswith('_:'):
+            uri = None
+        predicate = self._predicates[key] = (URIRef(uri) if uri else None, term)
+        return predicate
+
+    def node(self, node):
+        if '@value' in node or '@language' in node:
+            raise UnsupportedDocument('value object used as a node')
+        if node.get('@id'):
+            subject = self.resolve_id(node['@id'])
+            if subject is None:
+                return None
+        else:
+            subject = BNode()
+        for key, value in node.items():
+            if key == '@id':
+                continue
+            if key == '@type':
+                for rdf_type in value if isinstance(value, list) else [value]:
+                    obj = self.resolve_type(rdf_type)
+                    if obj is not None:
+                        self.triples.append((subject, RDF.type, obj))
+                continue
+            if key.startswith('@'):
+                raise UnsupportedDocument('unsupported keyword {}'.format(key))
+            predicate, term = self.predicate(key)
+            if predicate is None:
+                continue
+            for item in self.flatten(value):
+                obj = self.to_object(term, item)
+                if obj is None:
+                    continue
+                if term and term.reverse:
+                    self.triples.append((obj, predicate, subject))
+                else:
+                    self.triples.append((subject, predicate, obj))
+        return subject
+
+    def flatten(self, value):
+        if not isinstance(value, list):
+            return [value]
+        result = []
+        for item in value:
+            if isinstance(item, list):
+                raise UnsupportedDocument('nested lists')
+            result.append(item)
+        return result
+
+    def to_object(self, term, value):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            if '@value' in value or '@language' in value:
+                if set(value) - VALUE_KEYS:
+                    raise UnsupportedDocument('unsupported value object {}'.format(value))
+                lang = value.get('@language')
+                literal = value.get('@value')
+                if literal is None:
+                    return None
+                if lang:
+                    return Literal(literal, lang=lang)
+                if value.get('@type'):
+                    return Literal(literal, datatype=self.context.expand(value['@type']))
+                return Literal(literal)
+            if '@context' in value or set(k for k in value if k.startswith('@')) - NODE_KEYWORDS:
+                raise UnsupportedDocument('unsupported node object {}'.format(value))
+            return self.node(value)
+        if isinstance(value, list):
+            raise UnsupportedDocument('nested lists')
+        if term and term.type == '@id':
+            return self.resolve_id(value)
+        if isinstance(value, float):
+            return Literal(value, datatype=XSD.double)
+        return Literal(value)
+
+
+def normalise_entry(entry):
+    """
+    Copy of a 'defines' entry as the vocabulary documents show it: the
+    dli:label / dli:comment lists are flattened into rdfs:label /
+    rdfs:comment language maps. Also returns whether each map was present.
+    """
+    entry = deepcopy(entry)
+    has_label = has_comment = False
+    if entry.get('dli:label'):
+        has_label = True
+        entry['rdfs:label'] = {x['rdfs:label']['@language']: x['rdfs:label']['@value'] for x in entry['dli:label']}
+        del entry['dli:label']
+    if entry.get('dli:comment'):
+        has_comment = True
+        entry['rdfs:comment'] = {x['rdfs:comment']['@language']: x['rdfs:comment']['@value'] for x in entry['dli:comment']}
+        del entry['dli:comment']
+    return SourceEntry(entry, has_label, has_comment)
+
+
+def index_defines(document, normalise=normalise_entry):
+    """
+    Normalised entries of the document's 'defines' list by @id. For repeated
+    ids the last entry wins and the label/comment flags of all are kept,
+    like the linear scan this replaces. Entries are shared by every renderer
+    and must not be modified.
+    """
+    defines = {}
+    if isinstance(document, dict):
+        for entry in document.get('defines', []) or []:
+            if not isinstance(entry, dict):
+                continue
+            source = normalise(entry)
+            previous = defines.get(entry.get('@id'))
+            if previous:
+                source = source._replace(has_label=source.has_label or previous.has_label,
+                                         has_comment=source.has_comment or previous.has_comment)
+            defines[entry.get('@id')] = source
+    return defines
+
+
+def graph_from_document(document, graph=None, base=None):
+    """
+    Triples of an already decoded JSON-LD document. The vocabulary's shape is
+    converted directly, anything else goes through rdflib-jsonld. Relative
+    IRIs resolve against base, by default the current directory.
+    """
+    if graph is None:
+        graph = ConjunctiveGraph()
+    base = base or graph.absolutize('')
+    try:
+        loader = DirectLoader(document, base)
+        triples = loader.load()
+    except UnsupportedDocument:
+        to_rdf(document, graph, base)
+        return graph
+    for name, namespace in loader.namespaces():
+        graph.bind(name, namespace)
+    context = graph.default_context if isinstance(graph, ConjunctiveGraph) else graph
+    graph.addN((s, p, o, context) for s, p, o in triples)
+    return graph
+
+
+def snapshot_key(data, graph, base=None):
+    """Hash of the input bytes, everything that changes how they parse and the snapshot format."""
+    key = hashlib.sha256(data)
+    for part in (SNAPSHOT_VERSION, rdflib.__version__, rdflib_jsonld.__version__, sys.version_info[:2],
+                 type(graph).__name__, base or graph.absolutize('')):
+        key.update(str(part).encode('utf-8'))
+    return key.hexdigest()
+
+
+def encode_snapshot(graph, document):
+    """
+    Compact form of a parsed graph: every term once in a table, triples as a
+    flat array of table indexes, plus the namespace bindings and the decoded
+    document.
+    """
+    terms = []
+    ids = {}
+    triples = array('I')
+    for triple in graph.triples((None, None, None)):
+        for term in triple:
+            index = ids.get(term)
+            if index is None:
+                index = ids[term] = len(terms)
+                if isinstance(term, Literal):
+                    terms.append(('l', str(term), term.language, term.datatype and str(term.datatype)))
+                elif isinstance(term, BNode):
+                    terms.append(('b', str(term)))
+                else:
+                    terms.append(('u', str(term)))
+            triples.append(index)
+    return pickle.dumps({
+        'version': SNAPSHOT_VERSION,
+        'namespaces': [(prefix, str(namespace)) for prefix, namespace in graph.namespaces()],
+        'terms': terms,
+        'triples': triples.tobytes(),
+        'document': document,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_snapshot(data, graph):
+    snapshot = pickle.loads(data)
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('snapshot version mismatch')
+    terms = []
+    for term in snapshot['terms']:
+        if term[0] == 'l':
+            terms.append(Literal(term[1], lang=term[2], datatype=term[3] and URIRef(term[3])))
+        elif term[0] == 'b':
+            terms.append(BNode(term[1]))
+        else:
+            terms.append(URIRef(term[1]))
+    triples = array('I')
+    triples.frombytes(snapshot['triples'])
+    for prefix, namespace in snapshot['namespaces']:
+        graph.bind(prefix, namespace)
+    context = graph.default_context if isinstance(graph, ConjunctiveGraph) else graph
+    graph.addN((terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]], context) for i in range(0, len(triples), 3))
+    return snapshot['document']
+
+
+def write_snapshot(path, graph, document):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(encode_snapshot(graph, document))
+    os.replace(f.name, path)
+
+
+def clear_snapshots(cache_dir=SNAPSHOT_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def load_ontology(filename, graph=None, cache=True, cache_dir=SNAPSHOT_DIR, base=None):
+    """
+    Read and decode filename once and build both the graph and the defines
+    index from it. With cache, the parsed graph is snapshotted in cache_dir
+    and later runs on the same input bytes load the snapshot instead.
+    base is the IRI relative references resolve against (see graph_from_document).
+    """
+    if graph is None:
+        graph = ConjunctiveGraph()
+    with open(filename, 'rb') as f:
+        data = f.read()
+    snapshot_path = os.path.join(cache_dir, snapshot_key(data, graph, base) + '.snapshot') if cache else None
+    if snapshot_path and os.path.isfile(snapshot_path):
+        try:
+            with open(snapshot_path, 'rb') as f:
+                document = decode_snapshot(f.read(), graph)
+            return LoadedOntology(graph, document, index_defines(document))
+        except Exception:
+            # Truncated or otherwise unreadable: parse the source again and replace it below.
+            graph.remove((None, None, None))
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
+    document = json.loads(data.decode('utf-8'))
+    graph = graph_from_document(document, graph, base)
+    if snapshot_path:
+        try:
+            write_snapshot(snapshot_path, graph, document)
+        except OSError:
+            pass
+    return LoadedOntology(graph, document, index_defines(document))
+
+
+def fetch_cached(url, cache_dir=ONTOLOGY_CACHE_DIR, offline=False, timeout=30):
+    """
+    Path of a local copy of the document at url. A cached copy is
+    revalidated with its ETag / Last-Modified and only downloaded again when
+    it changed. If the server cannot be reached the cached copy is used
+    as is; with offline it always is, and there must be one.
+    """
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, name + '.jsonld')
+    meta_path = path + '.meta'
+    cached = os.path.isfile(path)
+    if offline:
+        if not cached:
+            raise OSError('{} is not cached in {}, run once without offline'.format(url, cache_dir))
+        return path
+    meta = {}
+    if cached:
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+    request = urllib.request.Request(url, headers={'Accept': 'application/ld+json, application/json;q=0.9, */*;q=0.1'})
+    if cached and meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if cached and meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read()
+            meta = {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except urllib.error.HTTPError as e:
+        if cached and e.code == 304:
+            return path
+        if cached:
+            print('Using cached {}: {}'.format(url, e), file=sys.stderr)
+            return path
+        raise
+    except (urllib.error.URLError, OSError) as e:
+        if cached:
+            print('Using cached {}: {}'.format(url, e), file=sys.stderr)
+            return path
+        raise
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return path
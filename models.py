@@ -1,22 +1,343 @@
+import os
 from rdflib import RDF, RDFS, Literal, OWL, XSD, BNode
-from utils import uri2niceString, SW, POT, DLI
+from utils import uri2niceString, namespace_resolver, GraphCache, SW, POT, DLI
 from const import POT_BASE
+from hierarchy import HierarchyIndex, get_hierarchy
+from profiler import PROFILER
+
+
+_registries = GraphCache()
+_type_ids = GraphCache()
+_class_views = GraphCache(per_term=True)
+_label_tables = GraphCache()
+_comment_tables = GraphCache()
+_ancestor_names = GraphCache(per_term=True)
+_fragment_caches = GraphCache()
+_property_sets = GraphCache()
+_directories = GraphCache(per_term=True)
+_UNSET = object()
+
+
+def get_registry(graph):
+    try:
+        return _registries[graph]
+    except KeyError:
+        registry = _registries[graph] = {}
+        return registry
+
+
+def clear_registry(graph):
+    _registries.pop(graph, None)
+
+
+class TypeIdTable:
+    """
+    Resolved prefix:Parent/Child/Name ids. A term's parent path is its first
+    real parent's path plus that parent's title, so paths are filled in
+    topological order and every level is resolved once.
+    """
+
+    def __init__(self, graph):
+        self.paths = {}
+        for term_class, predicate in ((RDFClass, RDFS.subClassOf), (RDFProperty, RDFS.subPropertyOf)):
+            index = get_hierarchy(graph) if predicate == RDFS.subClassOf else HierarchyIndex(graph, predicate)
+            for uriref in index.topological_order():
+                self.path(term_class(uriref, graph))
+
+    def path(self, term):
+        key = (type(term), term.uriref)
+        try:
+            return self.paths[key]
+        except KeyError:
+            pass
+        # Walk up the first-parent chain to a resolved (or root) term, then fill in downwards.
+        chain = [term]
+        seen = {key}
+        while True:
+            parents = chain[-1].get_real_parents()
+            if not parents:
+                self.paths[(type(chain[-1]), chain[-1].uriref)] = ''
+                break
+            parent = parents[0]
+            parent_key = (type(parent), parent.uriref)
+            if parent_key in self.paths:
+                chain.append(parent)
+                break
+            if parent_key in seen:
+                self.paths[(type(chain[-1]), chain[-1].uriref)] = ''
+                break
+            seen.add(parent_key)
+            chain.append(parent)
+        for child, parent in zip(reversed(chain[:-1]), reversed(chain)):
+            self.paths[(type(child), child.uriref)] = self.paths[(type(parent), parent.uriref)] + parent.title() + '/'
+        return self.paths[key]
+
+    def type_id(self, term):
+        return term.context() + ':' + self.path(term) + term.title()
+
+
+def build_type_ids(graph):
+    table = _type_ids[graph] = TypeIdTable(graph)
+    return table
+
+
+def get_type_ids(graph):
+    try:
+        return _type_ids[graph]
+    except KeyError:
+        return build_type_ids(graph)
+
+
+class PropertySets:
+    """
+    Properties of every class including inherited ones, resolved once in
+    topological order: a class's set is the union of its parents' sets and
+    the properties in its own domain. A class that adds nothing to a single
+    parent shares the parent's set, and each distinct set is sorted (by the
+    properties' nice strings, computed once) only the first time it is read.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.hierarchy = get_hierarchy(graph)
+        self.own = {}
+        for uriref, _, domain in graph.triples((None, RDFS.domain, None)):
+            self.own.setdefault(domain, set()).add(uriref)
+        self.sets = {}
+        self._keys = {}
+        self._sorted = {}
+        for uriref in self.hierarchy.topological_order():
+            self.resolve(uriref)
+
+    def resolve(self, uriref):
+        try:
+            return self.sets[uriref]
+        except KeyError:
+            pass
+        parents = self.hierarchy.get_parents(uriref)
+        if all(x in self.sets for x in parents):
+            inherited = [self.sets[x] for x in parents]
+        else:
+            # only reachable through a subclass cycle, walk the ancestors instead
+            inherited = [frozenset(self.own.get(x, ())) for x in self.hierarchy.ancestors(uriref)]
+        own = self.own.get(uriref)
+        if not own and len(inherited) == 1:
+            result = inherited[0]
+        else:
+            result = frozenset().union(own or (), *inherited)
+        self.sets[uriref] = result
+        return result
+
+    def sort_key(self, uriref):
+        try:
+            return self._keys[uriref]
+        except KeyError:
+            pass
+        key = self._keys[uriref] = str(RDFProperty(uriref, self.graph))
+        return key
+
+    def properties(self, uriref, only_context=None):
+        """RDFProperty tuple of the class uriref, sorted by str()."""
+        members = self.resolve(uriref)
+        key = (members, only_context)
+        try:
+            return self._sorted[key]
+        except KeyError:
+            pass
+        properties = [RDFProperty(x, self.graph) for x in sorted(members, key=self.sort_key)]
+        if only_context:
+            properties = [x for x in properties if x.context() == only_context]
+        result = self._sorted[key] = tuple(properties)
+        return result
+
+
+def build_property_sets(graph):
+    sets = _property_sets[graph] = PropertySets(graph)
+    return sets
+
 
-class RDFClass:
-    def __init__(self, uriref, graph):
-        self.uriref = uriref
-        self.namespaces = graph.namespaces
+def get_property_sets(graph):
+    try:
+        return _property_sets[graph]
+    except KeyError:
+        return build_property_sets(graph)
+
+
+class DomainTextTable:
+    """
+    Per-domain labels (or comments) of every property, from one scan of the
+    dli:label (dli:comment) nodes. Each property keeps its entries in graph
+    order as (domain name, language, text); entries without dli:domain are
+    the fallback used when nothing matches the requested domain.
+    """
+
+    def __init__(self, graph, predicate, text_predicate):
         self.graph = graph
+        self.predicate = predicate
+        self.text_predicate = text_predicate
+        self.entries = {}
+        self.fallbacks = {}
+        self.domains = {}
+        for uriref, _, node in graph.triples((None, predicate, None)):
+            self._read(uriref, node)
+        for uriref in self.entries:
+            self._read_domains(uriref)
+
+    def _read(self, uriref, node):
+        if not isinstance(node, BNode):
+            return
+        text = next(self.graph.triples((node, self.text_predicate, None)), None)
+        if text is None:
+            return
+        domain = next(self.graph.triples((node, DLI.domain, None)), None)
+        if domain is None:
+            self.fallbacks.setdefault(uriref, []).append((text[2].language, str(text[2])))
+        elif isinstance(domain[2], Literal):
+            self.entries.setdefault(uriref, []).append((str(domain[2]), text[2].language, str(text[2])))
+
+    def _read_domains(self, uriref):
+        self.domains[uriref] = set(uri2niceString(x[2], namespace_resolver(self.graph)) for x in self.graph.triples((uriref, RDFS.domain, None)))
+
+    def update(self, urirefs):
+        """Read the texts of urirefs again after their triples changed."""
+        for uriref in urirefs:
+            self.entries.pop(uriref, None)
+            self.fallbacks.pop(uriref, None)
+            self.domains.pop(uriref, None)
+            for _, _, node in self.graph.triples((uriref, self.predicate, None)):
+                self._read(uriref, node)
+            if uriref in self.entries:
+                self._read_domains(uriref)
+
+    def lookup(self, rdf_property, domain_selected=None):
+        """Texts by language of rdf_property as seen from the class domain_selected."""
+        texts = {}
+        entries = self.entries.get(rdf_property.uriref, ())
+        if entries:
+            domains = self.domains[rdf_property.uriref]
+            selected = str(domain_selected) if domain_selected else None
+            visible = ancestor_names(domain_selected) if domain_selected else None
+            for domain, language, text in entries:
+                if domain not in domains:
+                    continue
+                if selected and selected != domain and domain not in visible:
+                    continue
+                texts[language] = text
+        if not texts:
+            for language, text in self.fallbacks.get(rdf_property.uriref, ()):
+                texts[language] = text
+        return texts
+
+
+def build_text_tables(graph):
+    _label_tables[graph] = DomainTextTable(graph, DLI.label, RDFS.label)
+    _comment_tables[graph] = DomainTextTable(graph, DLI.comment, RDFS.comment)
+
+
+def get_label_table(graph):
+    try:
+        return _label_tables[graph]
+    except KeyError:
+        table = _label_tables[graph] = DomainTextTable(graph, DLI.label, RDFS.label)
+        return table
+
+
+def get_comment_table(graph):
+    try:
+        return _comment_tables[graph]
+    except KeyError:
+        table = _comment_tables[graph] = DomainTextTable(graph, DLI.comment, RDFS.comment)
+        return table
+
+
+def ancestor_names(rdf_class):
+    try:
+        return _ancestor_names[rdf_class]
+    except KeyError:
+        pass
+    names = _ancestor_names[rdf_class] = frozenset(str(RDFClass(x, rdf_class.graph)) for x in get_hierarchy(rdf_class.graph).ancestors(rdf_class.uriref))
+    return names
+
+
+def build_directories(rdf_class):
+    """
+    Directory of rdf_class for every inheritance path, e.g. Identity/Organization.
+    Memoized per class, so every parent's paths are built once for the whole DAG.
+    """
+    try:
+        return _directories[rdf_class]
+    except KeyError:
+        pass
+    parents = rdf_class.get_real_parents()
+    if len(parents):
+        directories = []
+        for parent in parents:
+            for directory in build_directories(parent):
+                directory = os.path.join(directory, rdf_class.title())
+                if directory not in directories:
+                    directories.append(directory)
+    else:
+        directories = [rdf_class.title(), ]
+    _directories[rdf_class] = directories
+    return directories
+
+
+class RDFTerm:
+    """
+    Interned wrapper around a URI of a graph: RDFClass(uri, graph) returns the
+    same object for the same uri and graph, so identity is equality and the
+    derived values below are computed once per term.
+    """
+    __slots__ = ('uriref', 'graph', '_name', '_title', '_context', '_type', '_real_parents', '__weakref__')
+    parent_predicate = None
+
+    def __new__(cls, uriref, graph):
+        registry = get_registry(graph)
+        key = (cls, uriref)
+        term = registry.get(key)
+        if term is None:
+            term = object.__new__(cls)
+            term.uriref = uriref
+            term.graph = graph
+            term._name = term._title = term._context = term._type = _UNSET
+            term._real_parents = _UNSET
+            registry[key] = term
+            PROFILER.count('models.' + cls.__name__)
+        return term
 
     def title(self):
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return name
+        if self._title is _UNSET:
+            uri, self._title = str(self).split(':')
+        return self._title
 
     def context(self):
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return uri
+        if self._context is _UNSET:
+            self._context, name = str(self).split(':')
+        return self._context
+
+    def get_real_parents(self):
+        if self._real_parents is _UNSET:
+            parents = []
+            for parent in self.graph.triples((self.uriref, self.parent_predicate, None)):
+                if self.uriref != parent[2] and next(self.graph.triples((parent[2], None, None)), None) is not None:
+                    parents.append(type(self)(parent[2], self.graph))
+            # By IRI (plain string order, so Class11 before Class2). The first parent decides the type id,
+            # and the graph order it used to come in changed with the hash seed between runs.
+            self._real_parents = tuple(sorted(parents, key=lambda x: str(x.uriref)))
+        return self._real_parents
+
+    def get_new_type_id(self):
+        return get_type_ids(self.graph).type_id(self)
+
+    def __str__(self):
+        if self._name is _UNSET:
+            self._name = uri2niceString(self.uriref, namespace_resolver(self.graph))
+        return self._name
+
+
+class RDFClass(RDFTerm):
+    __slots__ = ()
+    parent_predicate = RDFS.subClassOf
 
     def label(self):
         title = None
@@ -34,38 +355,7 @@ class RDFClass:
         return title
 
     def get_properties(self, only_context=None):
-        attributes = []
-
-        parents =  [RDFClass(x[2], self.graph) for x in self.graph.triples((self.uriref, RDFS.subClassOf, None))]
-        while len(parents):
-            tParents = []
-            for parent in parents:
-                if parent.uriref == self.uriref:
-                    continue
-                for attr in self.graph.triples((None, RDFS.domain, parent.uriref)):
-                    rdf_prop = RDFProperty(attr[0], self.graph)
-                    if only_context and rdf_prop.context() != only_context:
-                        continue
-                    attributes.append(rdf_prop)
-                tParents +=  [RDFClass(x[2], self.graph) for x in self.graph.triples((parent.uriref, RDFS.subClassOf, None))]
-            parents = tParents.copy()
-        for attr in self.graph.triples((None, RDFS.domain, self.uriref)):
-            rdf_prop = RDFProperty(attr[0], self.graph)
-            if only_context and rdf_prop.context() != only_context:
-                continue
-            attributes.append(rdf_prop)
-        attributes = sorted(attributes, key=lambda x: str(x))
-        return attributes
-
-    def get_real_parents(self):
-        parents = []
-        try:
-            for parent in list(self.graph.triples((self.uriref, RDFS.subClassOf, None))):
-                if len(list(self.graph.triples((parent[2], None, None)))) and self.uriref != parent[2]:
-                    parents.append(RDFClass(parent[2], self.graph))
-        except IndexError:
-            return []
-        return parents
+        return list(get_property_sets(self.graph).properties(self.uriref, only_context))
 
     def get_type_object(self):
         try:
@@ -75,43 +365,18 @@ class RDFClass:
         return rdf_type
 
     def get_type(self):
-        try:
-            rdf_type = uri2niceString(next(self.graph.triples((self.uriref, RDF.type, None)))[2], self.graph.namespaces())
-        except Exception as e:
-            return None
-        return rdf_type
+        if self._type is _UNSET:
+            try:
+                self._type = uri2niceString(next(self.graph.triples((self.uriref, RDF.type, None)))[2], namespace_resolver(self.graph))
+            except Exception as e:
+                self._type = None
+        return self._type
 
     def get_dependents(self):
-        all_dependees = set()
-        for i in self.graph.triples((None, RDFS.subClassOf, self.uriref)):
-            if i[0] == self.uriref:
-                continue
-            all_dependees.add(RDFClass(i[0], self.graph))
-            all_dependees.union(RDFClass(i[0], self.graph).get_dependents())
-
-        return all_dependees
+        return self.get_children()
 
     def get_children(self):
-        all_dependees = set()
-        for i in self.graph.triples((None, RDFS.subClassOf, self.uriref)):
-            if i[0] == self.uriref:
-                continue
-            all_dependees.add(RDFClass(i[0], self.graph))
-        return all_dependees
-
-    def get_new_type_id(self):
-        parents_path = ''
-        if self.get_real_parents():
-            real_parent = self.get_real_parents()[0]
-            while real_parent:
-                parents_path = real_parent.title() + '/' + parents_path
-                if real_parent.get_real_parents():
-                    real_parent = real_parent.get_real_parents()[0]
-                else:
-                    real_parent = None
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return uri + ':' + parents_path + self.title()
+        return [RDFClass(x, self.graph) for x in get_hierarchy(self.graph).get_children(self.uriref)]
 
     def get_labels(self):
         labels = {}
@@ -141,7 +406,7 @@ class RDFClass:
             if len(parents) > 1:
                 result['subClassOf'] = [x.get_new_type_id() for x in parents]
             elif len(parents) == 1:
-                result['subClassOf'] = uri2niceString(parents[0][2], self.graph.namespaces())
+                result['subClassOf'] = uri2niceString(parents[0][2], namespace_resolver(self.graph))
 
         #Labels
         labels = self.get_labels()
@@ -168,38 +433,9 @@ class RDFClass:
                 if len(list(self.graph.triples((class_type, None, None)))) == 0:
                     print('Parent Not Exists', self, i[2])
 
-    def __hash__(self):
-        return hash((str(self), self.get_type()))
-
-    def __str__(self):
-        return uri2niceString(self.uriref, self.namespaces())
-
-
-class RDFProperty:
-    def __init__(self, uriref, graph):
-        self.uriref = uriref
-        self.namespaces = graph.namespaces
-        self.graph = graph
-
-    def title(self):
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return name
-
-    def context(self):
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return uri
-
-    def get_real_parents(self):
-        parents = []
-        try:
-            for parent in list(self.graph.triples((self.uriref, RDFS.subPropertyOf, None))):
-                if len(list(self.graph.triples((parent[2], None, None)))) and self.uriref != parent[2]:
-                    parents.append(RDFProperty(parent[2], self.graph))
-        except IndexError:
-            return []
-        return parents
+class RDFProperty(RDFTerm):
+    __slots__ = ()
+    parent_predicate = RDFS.subPropertyOf
 
     def get_nested_at(self):
         try:
@@ -209,34 +445,9 @@ class RDFProperty:
             pass
         return None
 
-    def get_new_type_id(self):
-        parents_path = ''
-        if self.get_real_parents():
-            real_parent = self.get_real_parents()[0]
-            while real_parent:
-                parents_path = real_parent.title() + '/' + parents_path
-                if real_parent.get_real_parents():
-                    real_parent = real_parent.get_real_parents()[0]
-                else:
-                    real_parent = None
-        name = uri2niceString(self.uriref, self.namespaces())
-        uri, name = name.split(':')
-        return uri + ':' + parents_path + self.title()
-
     def get_context_name(self, domain_selected):
         context_names = list(self.graph.triples((self.uriref, DLI.contextName, None)))
-        all_parents = []
-        parents = [RDFClass(x[2], self.graph) for x in self.graph.triples((domain_selected.uriref, RDFS.subClassOf, None))]
-        all_parents.extend(parents)
-        while len(parents):
-            tParents = []
-            for parent in parents:
-                if parent.uriref == self.uriref:
-                    continue
-                tParents +=  [RDFClass(x[2], self.graph) for x in self.graph.triples((parent.uriref, RDFS.subClassOf, None))]
-            all_parents.extend(tParents)
-            parents = tParents.copy()
-        all_names = list(map(lambda x: str(x), all_parents))
+        all_names = ancestor_names(domain_selected)
         if not len(context_names):
             return self.title()
         for context_data in context_names:
@@ -267,7 +478,7 @@ class RDFProperty:
         restriction = {}
         for item in self.graph.triples((self.uriref, XSD.restriction, None)):
             for bnode in self.graph.triples((item[2], None, None)):
-                restriction[uri2niceString(bnode[1], self.graph.namespaces())] = bnode[2]
+                restriction[uri2niceString(bnode[1], namespace_resolver(self.graph))] = bnode[2]
         return restriction
 
     def get_domains(self):
@@ -277,11 +488,9 @@ class RDFProperty:
         return domains
 
     def get_type(self):
-        try:
-            rdf_type = uri2niceString(next(self.graph.triples((self.uriref, RDF.type, None)))[2], self.graph.namespaces())
-        except Exception as e:
-            raise
-        return rdf_type
+        if self._type is _UNSET:
+            self._type = uri2niceString(next(self.graph.triples((self.uriref, RDF.type, None)))[2], namespace_resolver(self.graph))
+        return self._type
 
     def get_required(self):
         try:
@@ -298,189 +507,268 @@ class RDFProperty:
         return readonly
 
     def get_labels(self, label_domain_selected=None):
-        labels = {}
-        domains = [uri2niceString(x[2], self.graph.namespaces()) for x in self.graph.triples((self.uriref, RDFS.domain, None))]
-        for label in self.graph.triples((self.uriref, DLI.label, None)):
-            if not isinstance(label[2], BNode):
-                continue
-            try:
-                label_domain = list(self.graph.triples((label[2], DLI.domain, None)))[0]
-            except IndexError:
-                continue
-            label_text = list(self.graph.triples((label[2], RDFS.label, None)))[0]
-            if isinstance(label_domain[2], Literal):
-                label_domain = str(label_domain[2])
-            if label_domain not in domains:
-                continue
-            if label_domain_selected and str(label_domain_selected) != label_domain:
-                not_found = True
-                parents = [RDFClass(x[2], self.graph) for x in self.graph.triples((label_domain_selected.uriref, RDFS.subClassOf, None))]
-                while len(parents):
-                    tParents = []
-                    for parent in parents:
-                        if parent.uriref == self.uriref:
-                            continue
-                        if str(parent) == label_domain:
-                            not_found = False
-                            break
-                        tParents +=  [RDFClass(x[2], self.graph) for x in self.graph.triples((parent.uriref, RDFS.subClassOf, None))]
-                    parents = tParents.copy()
-                if not_found:
-                    continue
-            labels[label_text[2].language] = str(label_text[2])
-        if not labels:
-            for label in self.graph.triples((self.uriref, DLI.label, None)):
-                if not isinstance(label[2], BNode):
-                    continue
-                try:
-                    label_domain = list(self.graph.triples((label[2], DLI.domain, None)))[0]
-                    continue
-                except IndexError:
-                    label_text = list(self.graph.triples((label[2], RDFS.label, None)))[0]
-                    labels[label_text[2].language] = str(label_text[2])
-        return labels
+        return get_label_table(self.graph).lookup(self, label_domain_selected)
 
     def get_comments(self, comment_domain_selected=None):
-        comments = {}
-        domains = [uri2niceString(x[2], self.graph.namespaces()) for x in self.graph.triples((self.uriref, RDFS.domain, None))]
-        for comment in self.graph.triples((self.uriref, DLI.comment, None)):
-            if not isinstance(comment[2], BNode):
-                continue
-            try:
-                comment_domain = list(self.graph.triples((comment[2], DLI.domain, None)))[0]
-            except IndexError:
-                continue
-            comment_text = list(self.graph.triples((comment[2], RDFS.comment, None)))[0]
-            if isinstance(comment_domain[2], Literal):
-                comment_domain = str(comment_domain[2])
-            if comment_domain not in domains:
-                continue
-            if comment_domain_selected and str(comment_domain_selected) != comment_domain:
-                not_found = True
-                parents =  [RDFClass(x[2], self.graph) for x in self.graph.triples((comment_domain_selected.uriref, RDFS.subClassOf, None))]
-                while len(parents):
-                    tParents = []
-                    for parent in parents:
-                        if parent.uriref == self.uriref:
-                            continue
-                        if str(parent) == comment_domain:
-                            not_found = False
-                            break
-                        tParents +=  [RDFClass(x[2], self.graph) for x in self.graph.triples((parent.uriref, RDFS.subClassOf, None))]
-                    parents = tParents.copy()
-                if not_found:
-                    continue
-            comments[comment_text[2].language] = str(comment_text[2])
-        if not comments:
-            for comment in self.graph.triples((self.uriref, DLI.comment, None)):
-                if not isinstance(comment[2], BNode):
-                    continue
-                try:
-                    comment_domain = list(self.graph.triples((comment[2], DLI.domain, None)))[0]
-                    continue
-                except IndexError:
-                    comment_text = list(self.graph.triples((comment[2], RDFS.comment, None)))[0]
-                    comments[comment_text[2].language] = str(comment_text[2])
-        return comments
+        return get_comment_table(self.graph).lookup(self, comment_domain_selected)
 
     def toVocab(self, noId=False, parent_domain=None):
+        return PropertyView(self, parent_domain).toVocab(noId=noId)
+
+    def toPython(self, noId=False, parent_domain=None):
+        return PropertyView(self, parent_domain).toPython(noId=noId)
+
+    def check(self):
+        for domain in self.graph.triples((self.uriref, RDFS.domain, None)):
+            domain_id = domain[2]
+            if len(list(self.graph.triples((domain_id, None, None)))) == 0:
+                print('Domain not exists', self, domain_id)
+
+        #Ranges
+        ranges = []
+        for r in self.graph.triples((self.uriref, RDFS.range, None)):
+            print(r[2])
+
+
+class PropertyView:
+    """
+    A property resolved as seen from one class (domain): everything the
+    renderers need, looked up once.
+    """
+
+    def __init__(self, rdf_property, domain=None):
+        self.property = rdf_property
+        self.domain = domain
+        self.context_name = rdf_property.get_context_name(domain_selected=domain) if domain is not None else rdf_property.title()
+        self.type_id = rdf_property.get_new_type_id()
+        self.labels = rdf_property.get_labels(label_domain_selected=domain)
+        self.comments = rdf_property.get_comments(comment_domain_selected=domain)
+        self.required = rdf_property.get_required()
+        self.readonly = rdf_property.get_readonly()
+        self.ranges = rdf_property.get_supported_range()
+        self.range_ids = [x.get_new_type_id() for x in self.ranges]
+        self.restrictions = rdf_property.get_restrictions()
+        self.nested_at = rdf_property.get_nested_at()
+        parents = rdf_property.get_real_parents()
+        self.parent = parents[0] if parents else None
+        self._fragments = {}
+
+    def label(self):
+        title = self.labels.get('en-us', None)
+        if not title:
+            title = str(self.property)
+        return title
+
+    def vocab_fragment(self, noId=False):
+        """toVocab() rendered once; shared by every caller and must not be modified."""
+        key = ('vocab', noId)
+        if key not in self._fragments:
+            self._fragments[key] = self.toVocab(noId=noId)
+        return self._fragments[key]
+
+    def python_fragment(self, noId=False):
+        """toPython() rendered once; shared by every caller and must not be modified."""
+        key = ('python', noId)
+        if key not in self._fragments:
+            self._fragments[key] = self.toPython(noId=noId)
+        return self._fragments[key]
+
+    def toVocab(self, noId=False):
         result = {
-            '@id': self.get_new_type_id(),
+            '@id': self.type_id,
             '@type': 'dli:SupportedAttribute',
             'subPropertyOf':'',
-            "dli:title": self.label(parent_domain),
-            "dli:required": self.get_required(),
-            "dli:readonly": self.get_readonly()
+            "dli:title": self.label(),
+            "dli:required": self.required,
+            "dli:readonly": self.readonly
         }
 
         if noId:
             del result['@id']
 
-        if self.get_real_parents():
-            result['subPropertyOf'] = str(self.get_real_parents()[0])
+        if self.parent:
+            result['subPropertyOf'] = str(self.parent)
         else:
             del result['subPropertyOf']
 
-        comments = self.get_comments(comment_domain_selected=parent_domain)
-        if len(comments):
-            result['dli:description'] = comments
+        if len(self.comments):
+            result['dli:description'] = dict(self.comments)
 
         # Domain
-        if len(self.get_supported_range()):
-            result['dli:valueType'] = [x.get_new_type_id() for x in self.get_supported_range()]
+        if len(self.range_ids):
+            result['dli:valueType'] = list(self.range_ids)
 
         # Restriction
-        restrictions = self.get_restrictions()
-        if restrictions:
-            result['xsd:restriction'] = restrictions
+        if self.restrictions:
+            result['xsd:restriction'] = dict(self.restrictions)
 
         return result
 
-    def toPython(self, noId=False, parent_domain=None):
+    def toPython(self, noId=False):
+        rdf_property = self.property
+        graph = rdf_property.graph
         result = {
-            '@id': self.get_new_type_id()
+            '@id': self.type_id
         }
 
         if noId:
             del result['@id']
 
         # Determine type
-        result['@type'] = self.get_type()
+        result['@type'] = rdf_property.get_type()
 
-        if self.get_real_parents():
-            result['subPropertyOf'] = str(self.get_real_parents()[0])
+        if self.parent:
+            result['subPropertyOf'] = str(self.parent)
 
         #Labels
-        labels = self.get_labels(label_domain_selected=parent_domain)
-        if len(labels):
-            result['rdfs:label'] = labels
+        if len(self.labels):
+            result['rdfs:label'] = dict(self.labels)
 
         #Comments
-        comments = self.get_comments(comment_domain_selected=parent_domain)
-        if len(comments):
-            result['rdfs:comment'] = comments
+        if len(self.comments):
+            result['rdfs:comment'] = dict(self.comments)
 
         #Doamin
         domains = []
-        for domain in self.graph.triples((self.uriref, RDFS.domain, None)):
-            domains.append(uri2niceString(domain[2], self.graph.namespaces()))
+        for domain in graph.triples((rdf_property.uriref, RDFS.domain, None)):
+            domains.append(uri2niceString(domain[2], namespace_resolver(graph)))
         if len(domains):
             result['domain'] = domains
 
         #Ranges
         ranges = []
-        for r in self.graph.triples((self.uriref, RDFS.range, None)):
-            ranges.append(uri2niceString(r[2], self.graph.namespaces()))
+        for r in graph.triples((rdf_property.uriref, RDFS.range, None)):
+            ranges.append(uri2niceString(r[2], namespace_resolver(graph)))
         if len(ranges):
             result['range'] = ranges
 
         # OWL Version Info
         try:
-            result['owl:versionInfo'] = next(self.graph.triples((self.uriref, OWL.versionInfo, None)))[2]
+            result['owl:versionInfo'] = next(graph.triples((rdf_property.uriref, OWL.versionInfo, None)))[2]
         except Exception as e:
             pass
 
         # VS Status
         try:
-            result['vs:term_status'] = next(self.graph.triples((self.uriref, SW.term_status, None)))[2]
+            result['vs:term_status'] = next(graph.triples((rdf_property.uriref, SW.term_status, None)))[2]
         except Exception as e:
             pass
 
         return result
 
-    def check(self):
-        for domain in self.graph.triples((self.uriref, RDFS.domain, None)):
-            domain_id = domain[2]
-            if len(list(self.graph.triples((domain_id, None, None)))) == 0:
-                print('Domain not exists', self, domain_id)
 
-        #Ranges
-        ranges = []
-        for r in self.graph.triples((self.uriref, RDFS.range, None)):
-            print(r[2])
+class FragmentCache:
+    """
+    PropertyViews shared between classes. A property renders the same for
+    every class that sees the same domains of its dli:label, dli:comment and
+    dli:contextName nodes, so views are keyed by (property, visible domains,
+    own domain) instead of by class, and an inherited property is resolved
+    once per distinct resolving domain rather than once per descendant.
+    """
 
-    def __hash__(self):
-        return hash((str(self), self.get_type()))
+    def __init__(self, graph):
+        self.graph = graph
+        self.views = {}
+        self.hits = 0
+        self.misses = 0
+        self._domains = {}
 
-    def __str__(self):
-        return uri2niceString(self.uriref, self.namespaces())
+    def resolving_domains(self, rdf_property):
+        """Domain names that can change how rdf_property is labelled, described or named."""
+        try:
+            return self._domains[rdf_property.uriref]
+        except KeyError:
+            pass
+        domains = set()
+        for table in (get_label_table(self.graph), get_comment_table(self.graph)):
+            domains.update(x[0] for x in table.entries.get(rdf_property.uriref, ()))
+        for context_data in self.graph.triples((rdf_property.uriref, DLI.contextName, None)):
+            domains.update(str(x[2]) for x in self.graph.triples((context_data[2], DLI.domain, None)))
+        domains = self._domains[rdf_property.uriref] = frozenset(domains)
+        return domains
+
+    def key(self, rdf_property, domain):
+        if domain is None:
+            return (rdf_property, None)
+        domains = self.resolving_domains(rdf_property)
+        # A class that is a resolving domain itself sees its own entries, which no other class does.
+        own = str(domain) if str(domain) in domains else None
+        return (rdf_property, domains & ancestor_names(domain), own)
+
+    def view(self, rdf_property, domain=None):
+        key = self.key(rdf_property, domain)
+        try:
+            view = self.views[key]
+        except KeyError:
+            self.misses += 1
+            PROFILER.count('models.PropertyView')
+            view = self.views[key] = PropertyView(rdf_property, domain)
+            return view
+        self.hits += 1
+        PROFILER.count('fragments.hit')
+        return view
+
+    def forget(self, urirefs):
+        """Drop the views of the properties urirefs, whose triples changed."""
+        for key in [x for x in self.views if x[0].uriref in urirefs]:
+            del self.views[key]
+        for uriref in urirefs:
+            self._domains.pop(uriref, None)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'fragments': len(self.views), 'hit_rate': self.hit_rate()}
+
+
+def get_fragment_cache(graph):
+    try:
+        return _fragment_caches[graph]
+    except KeyError:
+        cache = _fragment_caches[graph] = FragmentCache(graph)
+        return cache
+
+
+class ClassView:
+    """
+    A class with its inherited properties resolved once, in get_properties()
+    order, shared by the Context, ClassDefinitions and Vocabulary renderers.
+    """
+
+    def __init__(self, rdf_class):
+        self.rdf_class = rdf_class
+        self.type_id = rdf_class.get_new_type_id()
+        fragments = get_fragment_cache(rdf_class.graph)
+        self.properties = [fragments.view(x, rdf_class) for x in rdf_class.get_properties()]
+
+    def get_properties(self, only_context=None):
+        if not only_context:
+            return self.properties
+        return [x for x in self.properties if x.property.context() == only_context]
+
+
+def get_class_view(rdf_class):
+    try:
+        return _class_views[rdf_class]
+    except KeyError:
+        view = _class_views[rdf_class] = ClassView(rdf_class)
+        PROFILER.count('models.ClassView')
+        return view
+
+
+def forget_terms(graph, urirefs):
+    """
+    Bring the caches of graph up to date after the triples about urirefs
+    changed in place, as long as no type, parent or domain changed and no
+    term came or went; anything else needs every cache built again.
+    """
+    urirefs = set(urirefs)
+    get_label_table(graph).update(urirefs)
+    get_comment_table(graph).update(urirefs)
+    get_fragment_cache(graph).forget(urirefs)
+    property_sets = get_property_sets(graph)
+    for rdf_class in _class_views.terms(graph):
+        if rdf_class.uriref in urirefs or not urirefs.isdisjoint(property_sets.resolve(rdf_class.uriref)):
+            _class_views.pop(rdf_class)
@@ -1,19 +1,25 @@
 #!/usr/bin/python
-import sys
 import json
 import os
+import time
 import datetime
+import argparse
 from inflection import underscore
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from string import Template
 from rdflib import Graph, plugin, URIRef, Literal, ConjunctiveGraph
 from rdflib.serializer import Serializer
 from const import BASE_IDENTITY_POT, BASE_VOCABULARY_POT, VERSION, LABEL_REF, COMMENT_REF,\
         RANGE_REF, SUBCLASS_REF, POT_BASE, DLI_BASE, BASE_IDENTITY_DLI, BASE_VOCABULARY_DLI,\
-        CONF_NAME
+        CONF_NAME, DLI_ONTOLOGY_URL
 from rdflib_jsonld.parser import Parser
+from loader import load_ontology, clear_snapshots, fetch_cached
+from profiler import PROFILER
+from utils import GraphCache
 Triplet = namedtuple('Triplet', 'subject, predicate, object')
+_resolvers = GraphCache()
 
 
 def get_title_and_description(subject_uriref, graph):
@@ -43,29 +49,103 @@ def get_supported_types(subject_uriref, graph, context_key):
 
 
 
+class AttributeResolver:
+    """
+    What build_vocabulary and build_identity both need of a class, resolved
+    once per graph: its attributes (own and inherited, in the order the
+    ancestor walk finds them, one per name) and, per attribute, its title,
+    description and supported types.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._walks = {}
+        self._attributes = {}
+        self._titles = {}
+        self._types = {}
+
+    def walk(self, class_uriref):
+        """Ancestors breadth first, and every class a subClassOf edge on the way points to."""
+        try:
+            return self._walks[class_uriref]
+        except KeyError:
+            pass
+        ancestors = []
+        targets = set()
+        seen = {class_uriref}
+        parents = [x[2] for x in self.graph.triples((class_uriref, URIRef(SUBCLASS_REF), None))]
+        while len(parents):
+            tParents = []
+            for parent in parents:
+                targets.add(parent)
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                ancestors.append(parent)
+                tParents += [x[2] for x in self.graph.triples((parent, URIRef(SUBCLASS_REF), None))]
+            parents = tParents
+        result = self._walks[class_uriref] = (ancestors, frozenset(targets))
+        return result
+
+    def is_excluded(self, class_uriref, excludes):
+        return not self.walk(class_uriref)[1].isdisjoint(excludes)
+
+    def attributes(self, class_uriref):
+        """(key, attribute) pairs of the class, the first one found for each key."""
+        try:
+            return self._attributes[class_uriref]
+        except KeyError:
+            pass
+        attributes = []
+        keys = set()
+        ancestors, _ = self.walk(class_uriref)
+        for domain in ancestors + [class_uriref]:
+            for attribute in self.graph.triples((None, URIRef('http://www.w3.org/2000/01/rdf-schema#domain'), domain)):
+                key = attribute[0].split('#')[1]
+                if key in keys:
+                    continue
+                keys.add(key)
+                attributes.append((key, attribute[0]))
+        result = self._attributes[class_uriref] = tuple(attributes)
+        return result
+
+    def title_and_description(self, uriref):
+        try:
+            return self._titles[uriref]
+        except KeyError:
+            pass
+        result = self._titles[uriref] = get_title_and_description(uriref, self.graph)
+        return result
+
+    def supported_types(self, uriref, context_key):
+        try:
+            return self._types[uriref, context_key]
+        except KeyError:
+            pass
+        result = self._types[uriref, context_key] = get_supported_types(uriref, self.graph, context_key)
+        return result
+
+
+def get_attribute_resolver(graph):
+    try:
+        return _resolvers[graph]
+    except KeyError:
+        resolver = _resolvers[graph] = AttributeResolver(graph)
+        return resolver
+
+
 def build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=BASE_VOCABULARY_POT, context_key='pot', excludes=None, vocabulary_prefix=''):
     if class_triplet.subject in excludes:
         return None, None, True
+    resolver = get_attribute_resolver(graph)
+    if resolver.is_excluded(class_triplet.subject, excludes):
+        return None, None, True # If some parent are in exludes, we exclude whole vocab
     vocabulary_dict = deepcopy(BASE_VOCABULARY)
     class_key = class_triplet.subject.split('#')[1]
     vocabulary = '{}vocabularies/{}{}.jsonld#'.format(PATH_BASE, vocabulary_prefix, underscore(class_key))
     vocabulary_dict['@context']['vocab'] = vocabulary
     vocabulary_dict['@id'] = vocabulary[:-1]
-    title, description = get_title_and_description(class_triplet.subject, graph)
-    total_attributes = []
-    parents =  list(map(Triplet._make, list(graph.triples((class_triplet.subject, URIRef(SUBCLASS_REF), None)))))
-    while len(parents):
-        tParents = []
-        for parent in parents:
-            if parent.object in excludes:
-                return None, None, True # If some parent are in exludes, we exclude whole vocab
-            if parent.subject == parent.object:
-                continue
-            total_attributes += map(Triplet._make, list(graph.triples((None, URIRef('http://www.w3.org/2000/01/rdf-schema#domain'), parent.object))))
-            tParents +=  list(map(Triplet._make, list(graph.triples((parent.object, URIRef(SUBCLASS_REF), None)))))      
-        parents = tParents.copy()
-
-    total_attributes += map(Triplet._make, list(graph.triples((None, URIRef('http://www.w3.org/2000/01/rdf-schema#domain'), class_triplet.subject))))
+    title, description = resolver.title_and_description(class_triplet.subject)
     supported_class = {
       "@id": "{}:{}".format(context_key, class_key),
       "@type": "{}:{}".format(context_key, class_key),
@@ -89,12 +169,14 @@ def build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=B
           "dli:valueType": "xsd:object"
         },
     ]
-    for domain in total_attributes:
-        key = domain.subject.split('#')[1]
+    seen = set(attribute["dli:attribute"] for attribute in supported_attributes)
+    for key, attribute in resolver.attributes(class_triplet.subject):
         if key.lower() == 'name':
             continue
-        title, description = get_title_and_description(domain.subject, graph)
-        supported_types = get_supported_types(domain.subject, graph, context_key)
+        if "{}:{}".format(context_key, key) in seen:
+            continue
+        title, description = resolver.title_and_description(attribute)
+        supported_types = resolver.supported_types(attribute, context_key)
         supported_attribute = {
             "@type": "{}:SupportedAttribute".format(context_key),
             "dli:attribute": "{}:{}".format(context_key, key),
@@ -103,9 +185,9 @@ def build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=B
             "dli:required": False
         }
         if len(supported_types) > 0:
-            supported_attribute['dli:valueType'] = supported_types
-        if not next((attribute for attribute in supported_attributes if attribute["dli:attribute"] == supported_attribute["dli:attribute"]), None):
-            supported_attributes.append(supported_attribute)
+            supported_attribute['dli:valueType'] = list(supported_types)
+        seen.add(supported_attribute["dli:attribute"])
+        supported_attributes.append(supported_attribute)
     supported_class['{}:supportedAttribute'.format(context_key)] = supported_attributes
     vocabulary_dict['{}:supportedClass'.format(context_key)] = [supported_class,]
 
@@ -115,22 +197,7 @@ def build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=B
 def build_identity(graph, class_triplet, vocabulary, BASE_IDENTITY=BASE_IDENTITY_POT, context_key='pot'):
     identity_dict = deepcopy(BASE_IDENTITY)
     identity_dict['@vocab'] = vocabulary
-    rdf_class_uriref = class_triplet.subject
-    total_attributes = []
-    parents =  list(map(Triplet._make, list(graph.triples((class_triplet.subject, URIRef(SUBCLASS_REF), None)))))
-    while len(parents):
-        tParents = []
-        for parent in parents:
-            if parent.subject == parent.object:
-                continue
-            total_attributes += map(Triplet._make, list(graph.triples((None, URIRef('http://www.w3.org/2000/01/rdf-schema#domain'), parent.object))))
-            tParents +=  list(map(Triplet._make, list(graph.triples((parent.object, URIRef(SUBCLASS_REF), None)))))      
-        parents = tParents.copy()
-
-    total_attributes += map(Triplet._make, list(graph.triples((None, URIRef('http://www.w3.org/2000/01/rdf-schema#domain'), class_triplet.subject))))
-
-    for domain in total_attributes:
-        key = domain.subject.split('#')[1]
+    for key, attribute in get_attribute_resolver(graph).attributes(class_triplet.subject):
         if key == 'name':
             continue
         identity_dict[key] = {
@@ -139,7 +206,24 @@ def build_identity(graph, class_triplet, vocabulary, BASE_IDENTITY=BASE_IDENTITY
         }
     return identity_dict
 
-def parse(filename):
+def write_document(file_path, data):
+    with PROFILER.phase('serialize'):
+        data = json.dumps(data, indent=4, separators=(',', ': '))
+    with PROFILER.phase('write'):
+        with open(file_path, 'w') as f:
+            f.write(data)
+    if PROFILER.enabled:
+        PROFILER.count('files.written')
+        PROFILER.count('bytes.written', len(data.encode('utf-8')))
+
+
+def load_dli(url=DLI_ONTOLOGY_URL, cache=True, offline=False):
+    """Graph of the DLI ontology from the local copy of url, see fetch_cached."""
+    path = fetch_cached(url, offline=offline)
+    return load_ontology(path, graph=Graph(), cache=cache, base=url).graph
+
+
+def parse(filename, cache=True, offline=False, dli_url=DLI_ONTOLOGY_URL):
 
     classes_to_parse = []
     classes_to_exclude = []
@@ -155,23 +239,29 @@ def parse(filename):
         classes_to_parse.append(URIRef(c.replace('dli:', '{}ontologies/dli.jsonld#'.format(DLI_BASE))))
     for c in settings.get('pot_exclude', []):
         classes_to_exclude.append(URIRef(c.replace('pot:', '{}ontologies/pot.jsonld#'.format(POT_BASE))))
-    with open(filename) as f:
-        data = f.read()
+    # The DLI ontology is fetched and parsed while the POT classes are generated.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        dli_graph = executor.submit(load_dli, dli_url, cache=cache, offline=offline)
+        with PROFILER.phase('load'):
+            graph = load_ontology(filename, graph=Graph(), cache=cache).graph
+        PROFILER.instrument_graph(graph)
+        class_triples = graph.triples((None, URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#type'), URIRef('{}ontologies/pot.jsonld#Class'.format(POT_BASE))))
+        for class_triplet in map(Triplet._make, list(class_triples)):
+            started = time.perf_counter() if PROFILER.enabled else None
+            with PROFILER.phase('render'):
+                vocabulary_dict, vocabulary, exclude = build_vocabulary(graph, class_triplet, excludes=classes_to_exclude, vocabulary_prefix=vocabulary_prefix)
+                if exclude:
+                    continue
+                identity_dict = build_identity(graph, class_triplet, vocabulary)
 
-    graph = Graph().parse(data=data, format='json-ld')
-    class_triples = graph.triples((None, URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#type'), URIRef('{}ontologies/pot.jsonld#Class'.format(POT_BASE))))
-    for class_triplet in map(Triplet._make, list(class_triples)):
-        vocabulary_dict, vocabulary, exclude = build_vocabulary(graph, class_triplet, excludes=classes_to_exclude, vocabulary_prefix=vocabulary_prefix)
-        if exclude:
-            continue
-        identity_dict = build_identity(graph, class_triplet, vocabulary)
-
-        with open('result/pot/identities/identity-{}.jsonld'.format(underscore(class_triplet.subject.split('#')[1])), 'w') as f:
-            f.write(json.dumps({'@context': identity_dict}, indent=4, separators=(',', ': ')))
-        with open('result/pot/vocabularies/{}{}.jsonld'.format(vocabulary_prefix, underscore(class_triplet.subject.split('#')[1])), 'w') as f:
-            f.write(json.dumps(vocabulary_dict, indent=4, separators=(',', ': ')))
+            write_document('result/pot/identities/identity-{}.jsonld'.format(underscore(class_triplet.subject.split('#')[1])), {'@context': identity_dict})
+            write_document('result/pot/vocabularies/{}{}.jsonld'.format(vocabulary_prefix, underscore(class_triplet.subject.split('#')[1])), vocabulary_dict)
+            if started is not None:
+                PROFILER.class_time(str(class_triplet.subject), time.perf_counter() - started)
     
-    graph = Graph().parse('https://digitalliving.github.io/standards/ontologies/dli.jsonld', format='json-ld')
+        with PROFILER.phase('load_dli'):
+            graph = dli_graph.result()
+    PROFILER.instrument_graph(graph)
     
     class_triples = graph.triples((None, URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#type'), URIRef('{}ontologies/dli.jsonld#Class'.format(DLI_BASE))))
     found_classes = []
@@ -179,24 +269,33 @@ def parse(filename):
         if not class_triplet.subject in classes_to_parse:
             continue 
         found_classes.append(class_triplet.subject)           
-        vocabulary_dict, vocabulary, exclude = build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=BASE_VOCABULARY_DLI, context_key='dli', excludes=[])
-        identity_dict = build_identity(graph, class_triplet, vocabulary, BASE_IDENTITY=BASE_IDENTITY_DLI, context_key='dli')
+        started = time.perf_counter() if PROFILER.enabled else None
+        with PROFILER.phase('render'):
+            vocabulary_dict, vocabulary, exclude = build_vocabulary(graph, class_triplet, PATH_BASE=POT_BASE, BASE_VOCABULARY=BASE_VOCABULARY_DLI, context_key='dli', excludes=[])
+            identity_dict = build_identity(graph, class_triplet, vocabulary, BASE_IDENTITY=BASE_IDENTITY_DLI, context_key='dli')
 
-        with open('result/dli/identities/identity-{}.jsonld'.format(underscore(class_triplet.subject.split('#')[1])), 'w') as f:
-            f.write(json.dumps({'@context': identity_dict}, indent=4, separators=(',', ': ')))
-        with open('result/dli/vocabularies/{}{}.jsonld'.format(vocabulary_prefix, underscore(class_triplet.subject.split('#')[1])), 'w') as f:
-            f.write(json.dumps(vocabulary_dict, indent=4, separators=(',', ': ')))
+        write_document('result/dli/identities/identity-{}.jsonld'.format(underscore(class_triplet.subject.split('#')[1])), {'@context': identity_dict})
+        write_document('result/dli/vocabularies/{}{}.jsonld'.format(vocabulary_prefix, underscore(class_triplet.subject.split('#')[1])), vocabulary_dict)
+        if started is not None:
+            PROFILER.class_time(str(class_triplet.subject), time.perf_counter() - started)
     with open('error.log', 'a+') as el:
         for class_to_parse in classes_to_parse:
             if class_to_parse not in found_classes:
                 el.write('[{}] Class not found in DLI vocab: '.format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))+str(class_to_parse)+'\n')
             
 if __name__ == "__main__":
-    try:
-        filename = sys.argv[1]
-    except IndexError:
-        print('You have to select file to parse, please use: python parse.py <filename.jsonld>')
-        exit()
+    parser = argparse.ArgumentParser(description='Generate identities and vocabularies.')
+    parser.add_argument('filename', help='ontology to parse, e.g. pot.jsonld')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='parse the input even if a snapshot of it exists')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all parsed-graph snapshots first')
+    parser.add_argument('--offline', action='store_true', help='use the cached DLI ontology without contacting the server')
+    parser.add_argument('--dli-url', default=DLI_ONTOLOGY_URL, help='where to fetch the DLI ontology from')
+    parser.add_argument('--profile', metavar='PATH', help="write phase timings, counters and the slowest classes as JSON to PATH ('-' for stderr)")
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
+    if args.clear_cache:
+        clear_snapshots()
     try:
         os.makedirs('result/pot/identities')
         os.makedirs('result/pot/vocabularies')
@@ -204,4 +303,7 @@ if __name__ == "__main__":
         os.makedirs('result/dli/vocabularies')
     except FileExistsError as e:
         pass
-    parse(filename)
\ No newline at end of file
+    with PROFILER.phase('total'):
+        parse(args.filename, cache=args.cache, offline=args.offline, dli_url=args.dli_url)
+    if args.profile:
+        PROFILER.write_report(args.profile)
\ No newline at end of file
@@ -0,0 +1,143 @@
+import sys
+import json
+import time
+import heapq
+from collections import OrderedDict, Counter
+
+# Upper bounds (seconds) of the per-class render time histogram buckets.
+HISTOGRAM_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+class Profiler:
+    """
+    Phase timers, counters and per-class render times of one run. Disabled by
+    default; every hook checks enabled first, so an unprofiled run only pays
+    for that attribute lookup.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.phases = OrderedDict()
+        self.counters = Counter()
+        self.class_times = []
+        self.extra = {}
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def phase(self, name):
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def add_phase(self, name, wall, cpu):
+        phase = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        phase['wall'] += wall
+        phase['cpu'] += cpu
+        phase['calls'] += 1
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def class_time(self, name, seconds):
+        if self.enabled:
+            self.class_times.append((seconds, name))
+
+    def counted(self, name, function):
+        """function wrapped to count its calls under name."""
+        def wrapper(*args, **kwargs):
+            self.counters[name] += 1
+            return function(*args, **kwargs)
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def instrument_graph(self, graph):
+        """Count triples() calls on graph; does nothing when disabled."""
+        if self.enabled and not hasattr(graph.triples, '__wrapped__'):
+            graph.triples = self.counted('graph.triples', graph.triples)
+        return graph
+
+    def snapshot(self):
+        """Everything gathered so far, for merging into another process's profiler."""
+        return {'phases': dict(self.phases), 'counters': dict(self.counters), 'class_times': list(self.class_times)}
+
+    def take(self):
+        """snapshot() and start over, as forked workers do after every chunk."""
+        snapshot = self.snapshot()
+        self.phases = OrderedDict()
+        self.counters.clear()
+        del self.class_times[:]
+        return snapshot
+
+    def merge(self, snapshot):
+        for name, phase in snapshot['phases'].items():
+            merged = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key in merged:
+                merged[key] += phase[key]
+        self.counters.update(snapshot['counters'])
+        self.class_times.extend(snapshot['class_times'])
+
+    def histogram(self):
+        buckets = OrderedDict(('<{}'.format(x), 0) for x in HISTOGRAM_BOUNDS)
+        buckets['>={}'.format(HISTOGRAM_BOUNDS[-1])] = 0
+        for seconds, _ in self.class_times:
+            for bound in HISTOGRAM_BOUNDS:
+                if seconds < bound:
+                    buckets['<{}'.format(bound)] += 1
+                    break
+            else:
+                buckets['>={}'.format(HISTOGRAM_BOUNDS[-1])] += 1
+        return buckets
+
+    def report(self, slowest=10):
+        return {
+            'phases': self.phases,
+            'counters': OrderedDict(sorted(self.counters.items())),
+            'classes': {
+                'rendered': len(self.class_times),
+                'total': sum(x[0] for x in self.class_times),
+                'histogram': self.histogram(),
+                'slowest': [{'class': name, 'seconds': seconds} for seconds, name in heapq.nlargest(slowest, self.class_times)],
+            },
+            'extra': self.extra,
+        }
+
+    def write_report(self, path, slowest=10):
+        data = json.dumps(self.report(slowest), indent=1)
+        if path == '-':
+            sys.stderr.write(data + '\n')
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data)
+
+
+class _Phase:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_phase(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu)
+
+
+class _NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+PROFILER = Profiler()
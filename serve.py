@@ -0,0 +1,136 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from loader import load_ontology
+from generate import Generator, dump_json
+from const import CONF_NAME
+
+
+class DocumentCache:
+    """
+    Serialized documents by key, least recently used first out once their
+    total size passes max_bytes. Each entry keeps its ETag.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, data):
+        entry = (data, '"{}"'.format(hashlib.sha1(data).hexdigest()))
+        if len(data) > self.max_bytes:
+            return entry
+        old = self.entries.pop(key, None)
+        if old:
+            self.size -= len(old[0])
+        self.entries[key] = entry
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+        return entry
+
+
+class DocumentServer:
+    """
+    The newres tree of one ontology served on demand: request paths are
+    the paths generate.py writes below newres, every document is rendered
+    on its first request and its bytes then come from a DocumentCache.
+    """
+
+    def __init__(self, filename, settings, cache=True, max_bytes=64 * 1024 * 1024):
+        ontology = load_ontology(filename, cache=cache)
+        # The LRU below bounds memory, so the generator keeps no documents itself.
+        self.generator = Generator(ontology.graph, settings, ontology.defines, os.path.splitext(filename)[0], memoize=False)
+        self.context_name = self.generator.context_name
+        self.paths = {}
+        for file_path, kind, current_class in self.generator.paths():
+            self.paths[file_path] = (kind, str(current_class))
+        self.paths[self.generator.directory_path()] = ('directory', None)
+        self.cache = DocumentCache(max_bytes)
+        # The per-graph model caches are not safe for concurrent rendering.
+        self.lock = threading.Lock()
+
+    def document(self, path):
+        """(bytes, etag) of the document at path, or None if there is none."""
+        key = self.paths.get(path)
+        if key is None:
+            return None
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+            kind, name = key
+            data = self.generator.directory() if kind == 'directory' else self.generator.document(kind, name)
+            if data is None:
+                return None
+            return self.cache.put(key, dump_json(data).encode('utf-8'))
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    server_version = 'verbose-pancake'
+
+    def send_document(self, head=False):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).strip('/')
+        entry = self.server.documents.document(path)
+        if entry is None:
+            self.send_error(404)
+            return
+        data, etag = entry
+        if etag in [x.strip() for x in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/ld+json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self.send_document()
+
+    def do_HEAD(self):
+        self.send_document(head=True)
+
+
+def serve(documents, host='127.0.0.1', port=8000):
+    server = ThreadingHTTPServer((host, port), DocumentHandler)
+    server.documents = documents
+    print('Serving {} on http://{}:{}/{}/'.format(documents.context_name, host, server.server_port, documents.context_name), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve the Context, ClassDefinitions and Vocabulary documents, rendering each on its first request.')
+    parser.add_argument('filename', help='ontology to serve, e.g. pot.jsonld')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--cache-mb', type=float, default=64, help='size of the rendered document cache in megabytes')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='parse the input even if a snapshot of it exists')
+    args = parser.parse_args()
+    with open(CONF_NAME, encoding='utf-8') as f:
+        settings = json.load(f)
+    serve(DocumentServer(args.filename, settings, cache=args.cache, max_bytes=int(args.cache_mb * 1024 * 1024)), args.host, args.port)
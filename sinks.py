@@ -0,0 +1,344 @@
+import os
+import queue
+import zipfile
+import tempfile
+import threading
+import itertools
+from profiler import PROFILER
+
+# Fixed timestamp of every archive entry (the earliest a zip can store). With it and the fixed entry
+# order, the entry order and timestamps of an archive are deterministic; the documents are not, since
+# blank node and set ordering still vary between runs.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+FSYNC_POLICIES = ('never', 'always', 'close')
+
+
+def write_file(file_path, data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    if PROFILER.enabled:
+        PROFILER.count('files.written')
+        PROFILER.count('bytes.written', len(data.encode('utf-8')))
+
+
+def link_file(source, file_path, link):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    if os.path.lexists(file_path):
+        os.remove(file_path)
+    if link == 'symlink':
+        os.symlink(os.path.relpath(source, os.path.dirname(file_path)), file_path)
+    else:
+        os.link(source, file_path)
+    PROFILER.count('files.linked')
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def entry_directories(file_path):
+    """
+    Directories whose entries change when file_path is created: its own
+    and, for every one of them still missing, the directory above.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    result = [directory]
+    while not os.path.isdir(directory):
+        directory = os.path.dirname(directory) or '.'
+        result.append(directory)
+    return result
+
+
+def write_rendered(rendered, link=None):
+    """
+    Write every document of a rendered class. With link set to 'hardlink' or
+    'symlink', the copies for further inheritance paths link to the first file.
+    """
+    for directory in rendered.directories:
+        os.makedirs(directory, exist_ok=True)
+    for paths, data in rendered.documents:
+        write_file(paths[0], data)
+        for file_path in paths[1:]:
+            if link:
+                link_file(paths[0], file_path, link)
+            else:
+                write_file(file_path, data)
+
+
+class DirectorySink:
+    """
+    Writes documents into the output tree on disk. fsync is one of
+    FSYNC_POLICIES: never, after every write, or once when the sink is
+    closed. Syncing covers the files written and every directory that got
+    a new entry, so new files and directories survive a crash too.
+    """
+
+    def __init__(self, link=None, fsync='never'):
+        self.link = link
+        self.fsync = fsync
+        self.files = set()
+        self.directories = set()
+        self._lock = threading.Lock()
+
+    def _entries(self, file_paths):
+        directories = set()
+        if self.fsync != 'never':
+            for file_path in file_paths:
+                directories.update(entry_directories(file_path))
+        return directories
+
+    def _written(self, file_paths, directories):
+        if self.fsync == 'always':
+            self.sync(file_paths, directories)
+        elif self.fsync == 'close':
+            with self._lock:
+                self.files.update(file_paths)
+                self.directories.update(directories)
+
+    def sync(self, file_paths, directories):
+        for file_path in file_paths:
+            fsync_path(file_path)
+        # Deepest first, so a directory's entry is synced after its contents.
+        for directory in sorted(directories, key=lambda x: x.count(os.sep), reverse=True):
+            fsync_path(directory)
+
+    def write(self, file_path, data):
+        directories = self._entries([file_path])
+        write_file(file_path, data)
+        self._written([file_path], directories)
+
+    def write_rendered(self, rendered):
+        file_paths = list(rendered.paths())
+        directories = self._entries(file_paths + [os.path.join(x, '') for x in rendered.directories])
+        write_rendered(rendered, link=self.link)
+        self._written(file_paths, directories)
+
+    def keep(self, file_paths, directories):
+        pass
+
+    def stale(self, path, directory=False):
+        return []
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            files, directories = self.files, self.directories
+            self.files, self.directories = set(), set()
+        self.sync(files, directories)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ZipSink:
+    """
+    Streams documents straight into a zip archive instead of the output
+    tree. Entry names are the paths relative to root, as
+    shutil.make_archive(name, 'zip', root) stores them, and every entry gets
+    the same timestamp and mode. The archive is written to a temporary file
+    and moved into place on close, so a failed run leaves the old one intact.
+    With an fsync policy other than never, the finished archive and its
+    directory are synced before and after the move.
+    """
+
+    def __init__(self, archive_path, root, fsync='never'):
+        self.archive_path = archive_path
+        self.root = root
+        self.fsync = fsync
+        self.directories = set()
+        self.names = set()
+        directory = os.path.dirname(os.path.abspath(archive_path))
+        self._file = tempfile.NamedTemporaryFile(dir=directory, suffix='.zip', delete=False)
+        self.archive = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_DEFLATED)
+
+    def arcname(self, file_path):
+        return os.path.relpath(file_path, self.root).replace(os.sep, '/')
+
+    def add_directory(self, name):
+        if not name or name in self.directories:
+            return
+        self.add_directory(name.rpartition('/')[0])
+        self.directories.add(name)
+        info = zipfile.ZipInfo(name + '/', date_time=ZIP_DATE_TIME)
+        info.external_attr = (0o40755 << 16) | 0x10
+        self.archive.writestr(info, b'')
+
+    def write(self, file_path, data):
+        name = self.arcname(file_path)
+        if name in self.names:  # a class listed under several rdf:types is rendered once per type
+            return
+        self.names.add(name)
+        self.add_directory(name.rpartition('/')[0])
+        info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+        info.external_attr = 0o100644 << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        data = data.encode('utf-8')
+        self.archive.writestr(info, data)
+        if PROFILER.enabled:
+            PROFILER.count('files.archived')
+            PROFILER.count('bytes.written', len(data))
+
+    def write_rendered(self, rendered):
+        for directory in rendered.directories:
+            self.add_directory(self.arcname(directory))
+        for paths, data in rendered.documents:
+            for file_path in sorted(paths):
+                self.write(file_path, data)
+
+    def keep(self, file_paths, directories):
+        pass
+
+    def stale(self, path, directory=False):
+        return []
+
+    def flush(self):
+        pass
+
+    def close(self, discard=False):
+        if self.archive is None:
+            return
+        self.archive.close()
+        if self.fsync != 'never' and not discard:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self.archive = None
+        if discard:
+            os.remove(self._file.name)
+        else:
+            os.chmod(self._file.name, 0o644)
+            os.replace(self._file.name, self.archive_path)
+            if self.fsync != 'never':
+                fsync_path(os.path.dirname(os.path.abspath(self.archive_path)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(discard=exc_type is not None)
+
+
+class WriteError(Exception):
+    """Failed background writes, in the order they were submitted."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('{} write(s) failed, first: {}'.format(len(errors), errors[0][1]))
+
+
+class WriteBehindSink:
+    """
+    Hands the writes of another sink to worker threads, so rendering goes on
+    while documents are written. At most max_pending writes wait in the
+    queue; beyond that the renderer blocks until the workers catch up.
+    Failed writes are reported as one WriteError, in submission order, by
+    the next write, flush() or close().
+
+    Each document is one job (with all of its copies or links), so the
+    workers of a DirectorySink never race on a file. A ZipSink needs a
+    single worker to keep its entry order.
+    """
+
+    def __init__(self, sink, workers=4, max_pending=256):
+        self.sink = sink
+        self.queue = queue.Queue(max_pending)
+        self.errors = []
+        self.paths = set()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._drain, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def _drain(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                sequence, function, args = job
+                try:
+                    function(*args)
+                except Exception as e:
+                    with self._lock:
+                        self.errors.append((sequence, e))
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        with self._lock:
+            errors = sorted(self.errors, key=lambda x: x[0])
+        if errors:
+            raise WriteError(errors)
+
+    def submit(self, function, *args):
+        self.check()
+        self.queue.put((next(self._sequence), function, args))
+        PROFILER.count('writes.queued')
+
+    def write(self, file_path, data):
+        if file_path in self.paths:
+            return
+        self.paths.add(file_path)
+        self.submit(self.sink.write, file_path, data)
+
+    def write_rendered(self, rendered):
+        if rendered.directories:
+            self.submit(self.sink.write_rendered, rendered._replace(documents=[]))
+        for paths, data in rendered.documents:
+            paths = [x for x in paths if x not in self.paths]
+            if not paths:  # a class listed under several rdf:types is rendered once per type
+                continue
+            self.paths.update(paths)
+            self.submit(self.sink.write_rendered, rendered._replace(documents=[(paths, data)], directories=[]))
+
+    def keep(self, file_paths, directories):
+        self.sink.keep(file_paths, directories)
+
+    def stale(self, path, directory=False):
+        return self.sink.stale(path, directory)
+
+    def flush(self):
+        """Wait until everything submitted so far is written."""
+        self.queue.join()
+        self.check()
+
+    def _stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def close(self):
+        if not self.threads:
+            return
+        self._stop()
+        self.check()
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.close()
+            except BaseException as e:
+                self.sink.__exit__(type(e), e, e.__traceback__)
+                raise
+        else:
+            self._stop()
+            self.sink.__exit__(exc_type, exc, tb)
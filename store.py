@@ -0,0 +1,148 @@
+from array import array
+from bisect import bisect_left
+from rdflib import Graph
+from utils import ResolvingNamespaceManager
+
+
+class TripleStore:
+    """
+    Read-only copy of a graph for the generator. Terms are interned to
+    integers and every triple is packed into one integer per index
+    (SPO, POS, OSP); the indexes are kept sorted, so a lookup with any
+    bound prefix is two binary searches over a flat array.
+
+    Only the parts of the rdflib Graph API the generator uses are provided:
+    triples(), namespaces() and namespace_manager.
+    """
+
+    def __init__(self, graph):
+        self.terms = []
+        self.ids = {}
+        spo = []
+        for triple in graph.triples((None, None, None)):
+            spo.append(tuple(self._intern(term) for term in triple))
+        self._build(spo, graph.namespaces())
+
+    @classmethod
+    def from_ids(cls, terms, ids, spo, namespaces):
+        """
+        Store of triples already interned by the caller: spo are id triples
+        into terms, ids the reverse table. Neither is copied: the caller may
+        only append new terms, and then passes its changes to update().
+        """
+        store = cls.__new__(cls)
+        store.terms = terms
+        store.ids = ids
+        store._build(spo, namespaces)
+        return store
+
+    def _build(self, spo, namespaces):
+        self._build_indexes(spo)
+        self.namespace_manager = ResolvingNamespaceManager(Graph())
+        for prefix, namespace in namespaces:
+            self.namespace_manager.bind(prefix, namespace, override=True, replace=True)
+
+    def _build_indexes(self, spo):
+        self.bits = max(1, len(self.terms).bit_length())
+        self.mask = (1 << self.bits) - 1
+        typecode = 'Q' if self.bits * 3 <= 64 else None
+        self.spo = self._index(spo, (0, 1, 2), typecode)
+        self.pos = self._index(spo, (1, 2, 0), typecode)
+        self.osp = self._index(spo, (2, 0, 1), typecode)
+
+    def update(self, added, removed):
+        """
+        Apply id triples added and removed to a store made by from_ids, after
+        the caller appended their new terms. The indexes are patched in
+        place unless the terms outgrew the packed key width.
+        """
+        if len(self.terms).bit_length() > self.bits:
+            bits, mask = self.bits, self.mask
+            spo = set((x >> (2 * bits), (x >> bits) & mask, x & mask) for x in self.spo)
+            spo.difference_update(removed)
+            spo.update(added)
+            self._build_indexes(spo)
+            return
+        for index, (first, second, third) in ((self.spo, (0, 1, 2)), (self.pos, (1, 2, 0)), (self.osp, (2, 0, 1))):
+            for triple in removed:
+                key = self._pack(triple[first], triple[second], triple[third])
+                position = bisect_left(index, key)
+                if position < len(index) and index[position] == key:
+                    del index[position]
+            for triple in added:
+                key = self._pack(triple[first], triple[second], triple[third])
+                position = bisect_left(index, key)
+                if position == len(index) or index[position] != key:
+                    index.insert(position, key)
+
+    def _intern(self, term):
+        try:
+            return self.ids[term]
+        except KeyError:
+            index = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+            return index
+
+    def _pack(self, a, b, c):
+        return (((a << self.bits) | b) << self.bits) | c
+
+    def _index(self, triples, order, typecode):
+        first, second, third = order
+        keys = sorted(set(self._pack(x[first], x[second], x[third]) for x in triples))
+        return array(typecode, keys) if typecode else keys
+
+    def __len__(self):
+        return len(self.spo)
+
+    def namespaces(self):
+        return self.namespace_manager.namespaces()
+
+    def bind(self, prefix, namespace, override=True, replace=False):
+        self.namespace_manager.bind(prefix, namespace, override=override, replace=replace)
+
+    def _range(self, index, bound):
+        """Keys of index whose leading components equal bound (up to three ids)."""
+        if len(bound) == 3:
+            low = self._pack(*bound)
+            high = low + 1
+        elif len(bound) == 2:
+            low = self._pack(bound[0], bound[1], 0)
+            high = low + (1 << self.bits)
+        elif len(bound) == 1:
+            low = self._pack(bound[0], 0, 0)
+            high = low + (1 << (2 * self.bits))
+        else:
+            return index
+        start = bisect_left(index, low)
+        return index[start:bisect_left(index, high, start)]
+
+    def triples(self, pattern):
+        ids = []
+        for term in pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            index = self.ids.get(term)
+            if index is None:
+                return
+            ids.append(index)
+        s, p, o = ids
+        if s is not None:
+            if p is not None:
+                index, order, bound = self.spo, (0, 1, 2), [s, p] if o is None else [s, p, o]
+            elif o is not None:
+                index, order, bound = self.osp, (1, 2, 0), [o, s]
+            else:
+                index, order, bound = self.spo, (0, 1, 2), [s]
+        elif p is not None:
+            index, order, bound = self.pos, (2, 0, 1), [p] if o is None else [p, o]
+        elif o is not None:
+            index, order, bound = self.osp, (1, 2, 0), [o]
+        else:
+            index, order, bound = self.spo, (0, 1, 2), []
+        terms, bits, mask = self.terms, self.bits, self.mask
+        first, second, third = order
+        for key in self._range(index, bound):
+            parts = (key >> (2 * bits), (key >> bits) & mask, key & mask)
+            yield terms[parts[first]], terms[parts[second]], terms[parts[third]]
+
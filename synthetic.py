@@ -0,0 +1,162 @@
+#!/usr/bin/python
+import json
+import random
+import argparse
+from const import POT_BASE
+
+LANGUAGES = ['en-us', 'fi-fi', 'sv-se', 'de-de', 'fr-fr', 'es-es', 'et-ee', 'ru-ru']
+
+CONTEXT = {
+    "pot": "https://standards.oftrust.net/v1/Vocabulary/",
+    "dli": "https://standards.lifeengine.io/v1/Vocabulary/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "xsd": "http://www.w3.org/2001/XMLSchema#",
+    "vs": "http://www.w3.org/2003/06/sw-vocab-status/ns#",
+    "defines": {"@reverse": "rdfs:isDefinedBy"},
+    "subClassOf": {"@id": "rdfs:subClassOf", "@type": "@id"},
+    "subPropertyOf": {"@id": "rdfs:subPropertyOf", "@type": "@id"},
+    "domain": {"@id": "rdfs:domain", "@type": "@id"},
+    "range": {"@id": "rdfs:range", "@type": "@id"}
+}
+
+LEGACY_CONTEXT = {
+    "pot": "{}ontologies/pot.jsonld#".format(POT_BASE),
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "xsd": "http://www.w3.org/2001/XMLSchema#",
+    "defines": {"@reverse": "rdfs:isDefinedBy"},
+    "subClassOf": {"@id": "rdfs:subClassOf", "@type": "@id"},
+    "domain": {"@id": "rdfs:domain", "@type": "@id"},
+    "range": {"@id": "rdfs:range", "@type": "@id"}
+}
+
+
+class Shape:
+    """
+    Class hierarchy of a synthetic ontology: a tree filled breadth first with
+    the given branching up to depth levels, extra parents for a share of the
+    classes (always earlier classes, so there are no cycles) and properties
+    per class.
+    """
+
+    def __init__(self, classes=100, depth=6, branching=4, properties=3, multi_parent=0.05, seed=0):
+        rng = random.Random(seed)
+        self.names = ['Class{}'.format(i) for i in range(classes)]
+        self.parents = [[] for _ in range(classes)]
+        self.depths = [0] * classes
+        self.children = [[] for _ in range(classes)]
+        for i in range(1, classes):
+            parent = (i - 1) // max(1, branching)
+            if self.depths[parent] >= depth - 1:
+                parent = rng.choice([x for x in range(i) if self.depths[x] < depth - 1] or [0])
+            self.add_parent(i, parent)
+            if i > 2 and rng.random() < multi_parent:
+                extra = rng.randrange(i)
+                if extra not in self.parents[i] and self.depths[extra] < depth - 1:
+                    self.add_parent(i, extra)
+        self.properties = []
+        for i in range(classes):
+            for j in range(properties):
+                self.properties.append(('prop{}x{}'.format(i, j), i))
+        self.rng = rng
+
+    def add_parent(self, i, parent):
+        self.parents[i].append(parent)
+        self.children[parent].append(i)
+        self.depths[i] = max(self.depths[i], self.depths[parent] + 1)
+
+    def descendant(self, i):
+        node = i
+        while self.children[node] and (node == i or self.rng.random() < 0.5):
+            node = self.rng.choice(self.children[node])
+        return node if node != i else None
+
+
+def texts(key, name, languages, domain=None):
+    result = []
+    for language in LANGUAGES[:languages]:
+        entry = {key: {"@language": language, "@value": '{} {}'.format(name, language)}}
+        if domain:
+            entry['dli:domain'] = domain
+        result.append(entry)
+    return result
+
+
+def generate_ontology(classes=100, depth=6, branching=4, properties=3, multi_parent=0.05, languages=2, context_names=0.1, seed=0):
+    """POT-shaped JSON-LD document as read by generate.py."""
+    shape = Shape(classes, depth, branching, properties, multi_parent, seed)
+    defines = []
+    for i, name in enumerate(shape.names):
+        entry = {
+            "@id": "pot:" + name,
+            "@type": "pot:Class",
+            "subClassOf": ["pot:" + shape.names[x] for x in shape.parents[i]] or "pot:",
+            "dli:label": texts('rdfs:label', name, languages),
+            "dli:comment": texts('rdfs:comment', name, languages),
+        }
+        defines.append(entry)
+    for name, i in shape.properties:
+        domain = "pot:" + shape.names[i]
+        entry = {
+            "@id": "pot:" + name,
+            "@type": "owl:DatatypeProperty",
+            "domain": domain,
+            "range": "xsd:string",
+            "dli:label": texts('rdfs:label', name, languages, domain) + texts('rdfs:label', name, 1),
+            "dli:comment": texts('rdfs:comment', name, languages, domain),
+        }
+        if shape.rng.random() < context_names:
+            descendant = shape.descendant(i)
+            if descendant is not None:
+                entry['dli:contextName'] = [{"dli:domain": "pot:" + shape.names[descendant], "dli:name": name + 'Override'}]
+                entry['dli:label'].extend(texts('rdfs:label', name + ' override', languages, "pot:" + shape.names[descendant]))
+        defines.append(entry)
+    return {"@context": CONTEXT, "@id": "pot:", "@type": "owl:Ontology", "defines": defines}
+
+
+def generate_legacy_ontology(classes=100, depth=6, branching=4, properties=3, multi_parent=0.05, languages=2, seed=0, **kwargs):
+    """The same hierarchy in the shape parse.py reads."""
+    shape = Shape(classes, depth, branching, properties, multi_parent, seed)
+    defines = []
+    for i, name in enumerate(shape.names):
+        defines.append({
+            "@id": "pot:" + name,
+            "@type": "pot:Class",
+            "subClassOf": ["pot:" + shape.names[x] for x in shape.parents[i]],
+            "rdfs:label": [{"@language": x[:2], "@value": name} for x in LANGUAGES[:languages]],
+            "rdfs:comment": [{"@language": x[:2], "@value": name + ' comment'} for x in LANGUAGES[:languages]],
+        })
+    for name, i in shape.properties:
+        defines.append({
+            "@id": "pot:" + name,
+            "@type": "owl:DatatypeProperty",
+            "domain": "pot:" + shape.names[i],
+            "range": "xsd:string",
+            "rdfs:label": [{"@language": x[:2], "@value": name} for x in LANGUAGES[:languages]],
+        })
+    return {"@context": LEGACY_CONTEXT, "@id": "pot:", "@type": "owl:Ontology", "defines": defines}
+
+
+def write_ontology(path, document):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a synthetic POT-shaped ontology.')
+    parser.add_argument('filename', help='output file, e.g. synthetic.jsonld')
+    parser.add_argument('--classes', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--branching', type=int, default=4)
+    parser.add_argument('--properties', type=int, default=3, help='properties per class')
+    parser.add_argument('--multi-parent', type=float, default=0.05, help='share of classes with a second parent')
+    parser.add_argument('--languages', type=int, default=2, help='languages per label and comment')
+    parser.add_argument('--context-names', type=float, default=0.1, help='share of properties renamed for a descendant class')
+    parser.add_argument('--legacy', action='store_true', help='write the shape parse.py reads')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate = generate_legacy_ontology if args.legacy else generate_ontology
+    write_ontology(args.filename, generate(args.classes, args.depth, args.branching, args.properties, args.multi_parent,
+                                           args.languages, context_names=args.context_names, seed=args.seed))
@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import CONTEXT
+
+
+def text(key, value, domain=None):
+    """A dli:label or dli:comment entry, for the class domain if given."""
+    entry = {key: {'@language': 'en-us', '@value': value}}
+    if domain:
+        entry['dli:domain'] = domain
+    return entry
+
+
+@pytest.fixture
+def ontology(tmp_path):
+    """Writes an ontology with the given defines and returns its path."""
+    def write(defines, name='pot.jsonld'):
+        path = tmp_path / name
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'@context': CONTEXT, '@id': 'pot:', 'defines': defines}, f, indent=1)
+        return str(path)
+    return write
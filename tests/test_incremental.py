@@ -0,0 +1,31 @@
+import os
+import sys
+import json
+import subprocess
+from conftest import ROOT
+from synthetic import generate_ontology, write_ontology
+
+FINGERPRINTS = '''
+import sys, json
+from loader import load_ontology
+from generate import prepare_graph, collect_classes
+from incremental import Fingerprinter
+ontology = load_ontology(sys.argv[1], cache=False)
+graph = prepare_graph(ontology.graph)
+fingerprinter = Fingerprinter(graph, ontology.defines, 'settings')
+print(json.dumps({str(x): fingerprinter.fingerprint(x) for x in collect_classes(graph)[0]}))
+'''
+
+
+def fingerprints(path, hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed), PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', FINGERPRINTS, path], env=env, cwd=ROOT)
+    return json.loads(output)
+
+
+def test_fingerprints_do_not_depend_on_the_process(tmp_path):
+    path = str(tmp_path / 'pot.jsonld')
+    write_ontology(path, generate_ontology(classes=60, multi_parent=0.3))
+    first = fingerprints(path, 1)
+    assert len(first) == 60
+    assert fingerprints(path, 2) == first
@@ -0,0 +1,44 @@
+from conftest import text
+from generate import Generator
+
+
+def test_sibling_domains_keep_their_own_texts(ontology):
+    path = ontology([
+        {'@id': 'pot:Thing', '@type': 'pot:Class', 'subClassOf': 'pot:'},
+        {'@id': 'pot:Apple', '@type': 'pot:Class', 'subClassOf': ['pot:Thing']},
+        {'@id': 'pot:Boat', '@type': 'pot:Class', 'subClassOf': ['pot:Thing']},
+        {'@id': 'pot:name', '@type': 'owl:DatatypeProperty', 'domain': ['pot:Apple', 'pot:Boat'], 'range': 'xsd:string',
+         'dli:label': [text('rdfs:label', 'Apple name', 'pot:Apple'), text('rdfs:label', 'Boat name', 'pot:Boat')],
+         'dli:comment': [text('rdfs:comment', 'Name of the apple', 'pot:Apple'), text('rdfs:comment', 'Name of the boat', 'pot:Boat')]},
+    ])
+    generator = Generator(path, context_name='pot')
+    for name, label, comment in (('Apple', 'Apple name', 'Name of the apple'), ('Boat', 'Boat name', 'Name of the boat')):
+        attribute = generator.definition('pot:' + name)['dli:supportedClass']['dli:supportedAttribute']['name']
+        assert attribute['dli:title'] == label
+        assert attribute['dli:description'] == {'en-us': comment}
+        vocabulary = generator.vocabulary('pot:' + name)['name']
+        assert vocabulary['rdfs:label'] == {'en-us': label}
+        assert vocabulary['rdfs:comment'] == {'en-us': comment}
+
+
+def test_first_parent_is_the_lowest_iri(ontology):
+    # Both lists Class2 first, but Class11 sorts first and decides the type ids.
+    path = ontology([
+        {'@id': 'pot:Thing', '@type': 'pot:Class', 'subClassOf': 'pot:'},
+        {'@id': 'pot:Class2', '@type': 'pot:Class', 'subClassOf': ['pot:Thing']},
+        {'@id': 'pot:Class11', '@type': 'pot:Class', 'subClassOf': ['pot:Thing']},
+        {'@id': 'pot:Both', '@type': 'pot:Class', 'subClassOf': ['pot:Class2', 'pot:Class11']},
+        {'@id': 'pot:Leaf', '@type': 'pot:Class', 'subClassOf': ['pot:Both']},
+    ])
+    generator = Generator(path, context_name='pot')
+    both = generator.definition('pot:Both')['dli:supportedClass']
+    assert both['@id'] == 'pot:Thing/Class11/Both'
+    assert both['subClassOf'] == 'pot:Thing/Class11'
+    leaf = generator.definition('pot:Leaf')['dli:supportedClass']
+    assert leaf['@id'] == 'pot:Thing/Class11/Both/Leaf'
+    assert leaf['subClassOf'] == 'pot:Thing/Class11/Both'
+    # Documents are still written below every parent.
+    assert sorted(x for x, kind, _ in generator.paths() if kind == 'ClassDefinitions' and x.endswith('/Leaf.jsonld')) == [
+        'pot/ClassDefinitions/Thing/Class11/Both/Leaf.jsonld',
+        'pot/ClassDefinitions/Thing/Class2/Both/Leaf.jsonld',
+    ]
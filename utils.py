@@ -1,5 +1,8 @@
 from collections import namedtuple
+from functools import lru_cache
 import rdflib
+from rdflib.namespace import NamespaceManager
+from profiler import PROFILER
 
 POT = rdflib.Namespace('https://standards.oftrust.net/v1/Vocabulary/')
 DLI = rdflib.Namespace('https://standards.lifeengine.io/v1/Vocabulary/')
@@ -34,6 +37,134 @@ def inferNamespacePrefix(aUri):
     return prefix
 
 
+class NamespaceResolver:
+    """
+    Compiled form of a namespace list.
+
+    URIs are matched against the longest bound namespace, namespace URIs are
+    bucketed by length so a lookup is one dict probe per distinct length.
+    Results are kept in bounded LRU caches in both directions.
+    """
+
+    def __init__(self, namespaces, cache_size=8192):
+        self.namespaces = []
+        self.prefixes = {}
+        by_uri = {}
+        for prefix, namespace in namespaces:
+            if not prefix:  # base namespace is never used for qnames
+                continue
+            namespace = str(namespace)
+            self.namespaces.append((prefix, rdflib.URIRef(namespace)))
+            self.prefixes.setdefault(prefix, namespace)
+            by_uri.setdefault(namespace, prefix)
+        self.lengths = sorted(set(len(x) for x in by_uri), reverse=True)
+        self.by_uri = by_uri
+        self.qname = lru_cache(maxsize=cache_size)(self._qname)
+        self.uri = lru_cache(maxsize=cache_size)(self._uri)
+
+    def _qname(self, uri):
+        for length in self.lengths:
+            prefix = self.by_uri.get(uri[:length])
+            if prefix is not None:
+                return prefix + ":" + uri[length:]
+        return uri
+
+    def _uri(self, qname):
+        prefix, sep, _ = qname.partition(":")
+        if sep and prefix in self.prefixes:
+            return rdflib.term.URIRef(self.prefixes[prefix] + qname.split(":")[1])
+        return rdflib.term.URIRef(qname)
+
+    def __iter__(self):
+        return iter(self.namespaces)
+
+
+class ResolvingNamespaceManager(NamespaceManager):
+    """
+    Namespace manager that owns the graph's NamespaceResolver and drops it
+    whenever bindings change.
+    """
+
+    def __init__(self, graph):
+        self.resolver = None
+        super().__init__(graph)
+
+    def bind(self, prefix, namespace, override=True, replace=False):
+        super().bind(prefix, namespace, override=override, replace=replace)
+        self.resolver = None
+
+    def get_resolver(self):
+        if self.resolver is None:
+            self.resolver = NamespaceResolver(self.namespaces())
+        return self.resolver
+
+
+def namespace_resolver(graph):
+    """
+    Resolver for the current bindings of graph. Installs a
+    ResolvingNamespaceManager on the graph the first time it is asked.
+    """
+    if not isinstance(graph.namespace_manager, ResolvingNamespaceManager):
+        graph.namespace_manager = ResolvingNamespaceManager(graph)
+    return graph.namespace_manager.get_resolver()
+
+
+class GraphCache:
+    """
+    Values derived from a graph, kept in a dict on the graph object itself.
+    A WeakKeyDictionary keyed by the graph would never drop an entry whose
+    value refers back to the graph; here graph and values form one cycle
+    the garbage collector frees together. With per_term, keys are terms of
+    a graph (anything with a .graph) and each graph keeps its own table.
+    """
+
+    def __init__(self, per_term=False):
+        self.per_term = per_term
+
+    def _caches(self, key):
+        graph = key.graph if self.per_term else key
+        return graph.__dict__.setdefault('_graph_caches', {})
+
+    def __getitem__(self, key):
+        caches = self._caches(key)
+        if self.per_term:
+            return caches[self][key]
+        return caches[self]
+
+    def __setitem__(self, key, value):
+        caches = self._caches(key)
+        if self.per_term:
+            caches.setdefault(self, {})[key] = value
+        else:
+            caches[self] = value
+
+    def pop(self, key, default=None):
+        caches = self._caches(key)
+        if self.per_term:
+            return caches.get(self, {}).pop(key, default)
+        return caches.pop(self, default)
+
+    def terms(self, graph):
+        """Terms of graph that have a value in this per_term cache."""
+        return list(graph.__dict__.get('_graph_caches', {}).get(self, ()))
+
+
+def clear_graph_caches(graph):
+    """Drop the values of every GraphCache for graph, e.g. after its triples changed."""
+    graph.__dict__.pop('_graph_caches', None)
+
+
+@lru_cache(maxsize=32)
+def _compiled_resolver(namespaces):
+    return NamespaceResolver(namespaces)
+
+
+def _get_resolver(namespaces):
+    if isinstance(namespaces, NamespaceResolver):
+        return namespaces
+    return _compiled_resolver(tuple(namespaces))
+
+
 def uri2niceString(aUri, namespaces=None):
     """
     From a URI, returns a nice string representation that uses also the namespace symbols
@@ -48,33 +179,17 @@ def uri2niceString(aUri, namespaces=None):
     ('rdf', rdflib.URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#'))
     (u'xsd', rdflib.URIRef('http://www.w3.org/2001/XMLSchema#'))]
 
+    A NamespaceResolver (see namespace_resolver) can be passed instead of the list.
     """
+    if PROFILER.enabled:
+        PROFILER.counters['uri2niceString'] += 1
     if not namespaces:
         namespaces = NAMESPACES_DEFAULT
     if not aUri:
         stringa = ""
     elif type(aUri) == rdflib.term.URIRef:
-        # we have a URI: try to create a qName
-        stringa = aUri.toPython()
-        for aNamespaceTuple in namespaces:
-            if aNamespaceTuple[0] == '':
-                continue
-            try:  # check if it matches the available NS
-                if stringa.find(aNamespaceTuple[1].__str__()) == 0:
-                    if aNamespaceTuple[0]:  # for base NS, it's empty
-                        stringa = aNamespaceTuple[0] + ":" + stringa[len(
-                            aNamespaceTuple[1].__str__()):]
-                    else:
-                        prefix = inferNamespacePrefix(aNamespaceTuple[1])
-                        if prefix:
-                            stringa = prefix + ":" + stringa[len(
-                                aNamespaceTuple[1].__str__()):]
-                        else:
-                            stringa = ":" + stringa[len(aNamespaceTuple[1].
-                                                        __str__()):]
-            except Exception as e:
-                stringa = "error"
-
+        # we have a URI: try to create a qName from the longest matching NS
+        stringa = _get_resolver(namespaces).qname(aUri.toPython())
     elif type(aUri) == rdflib.term.Literal:
         stringa = "\"%s\"" % aUri  # no string casting so to prevent encoding errors
     else:
@@ -101,16 +216,11 @@ def niceString2uri(aUriString, namespaces=None):
     ('rdf', rdflib.URIRef('http://www.w3.org/1999/02/22-rdf-syntax-ns#'))
     (u'xsd', rdflib.URIRef('http://www.w3.org/2001/XMLSchema#'))]
 
+    A NamespaceResolver (see namespace_resolver) can be passed instead of the list.
     """
 
     if not namespaces:
         namespaces = []
 
-    for aNamespaceTuple in namespaces:
-        if aNamespaceTuple[0] and aUriString.find(
-                aNamespaceTuple[0].__str__() + ":") == 0:
-            aUriString_name = aUriString.split(":")[1]
-            return rdflib.term.URIRef(aNamespaceTuple[1] + aUriString_name)
-
     # we dont handle the 'base' URI case
-    return rdflib.term.URIRef(aUriString)
+    return _get_resolver(namespaces).uri(aUriString)
@@ -0,0 +1,339 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from rdflib import ConjunctiveGraph, URIRef, RDF, RDFS
+from loader import DirectLoader, UnsupportedDocument, load_ontology, index_defines, normalise_entry
+from generate import prepare_graph, update_graph, collect_classes, render_classes, create_identity_directory_from_rdf_class, dump_json
+from incremental import Fingerprinter, Manifest, settings_fingerprint, remove_stale
+from sinks import DirectorySink
+from store import TripleStore
+from const import CONF_NAME
+
+
+# Predicates the hierarchy, type ids and property sets are built from.
+RESHAPING_PREDICATES = (RDF.type, RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain)
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True)
+
+
+class HotOntology:
+    """
+    Parsed ontology kept in memory between edits. The triples of every
+    'defines' entry are kept apart, so after an edit only the entries whose
+    JSON changed are converted again and their old triples (blank nodes
+    included) are removed from the graph. A changed @context or top-level
+    node, or a document the direct loader does not handle, is parsed again
+    in full.
+
+    Terms are interned as they are converted and the triples kept as id
+    triples. The compact store made by store() shares them and every later
+    update patches it with the id triples that came and went.
+
+    touched holds the subjects whose triples the last update changed, or
+    None after a full parse; reshaped tells whether that changed a type,
+    parent or domain or added or removed a term.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.data = None
+        self.graph = None
+        self.document = None
+        self.defines = {}
+        self.entries = {}
+        self.sources = {}
+        self.counts = Counter()
+        self.terms = []
+        self.ids = {}
+        self.loader = None
+        self.touched = None
+        self.reshaped = True
+        self.compact = None
+        self.added = []
+        self.removed = []
+
+    def head(self, document):
+        return canonical({k: v for k, v in document.items() if k != 'defines'})
+
+    def intern(self, triples):
+        result = []
+        for triple in triples:
+            key = []
+            for term in triple:
+                index = self.ids.get(term)
+                if index is None:
+                    index = self.ids[term] = len(self.terms)
+                    self.terms.append(term)
+                key.append(index)
+            result.append(tuple(key))
+        return result
+
+    def entry_triples(self, entry):
+        self.loader.triples = []
+        self.loader.node({'@id': self.document['@id'], 'defines': [entry]})
+        return self.intern(self.loader.triples)
+
+    def add(self, triples):
+        for triple in triples:
+            self.counts[triple] += 1
+            if self.counts[triple] == 1:
+                self.graph.add(tuple(self.terms[x] for x in triple))
+                self.added.append(triple)
+
+    def remove(self, triples):
+        for triple in triples:
+            self.counts[triple] -= 1
+            if not self.counts[triple]:
+                del self.counts[triple]
+                self.graph.remove(tuple(self.terms[x] for x in triple))
+                self.removed.append(triple)
+
+    def touch(self, triples):
+        self.touched.update(self.terms[s] for s, _, _ in triples if isinstance(self.terms[s], URIRef))
+
+    def store(self, graph):
+        """Compact copy of graph for prepare_graph, kept up to date by later updates."""
+        if self.loader is None:
+            return TripleStore(graph)
+        self.compact = TripleStore.from_ids(self.terms, self.ids, list(self.counts), graph.namespaces())
+        return self.compact
+
+    def is_reshaping(self, added, removed):
+        predicates = set(self.ids[x] for x in RESHAPING_PREDICATES if x in self.ids)
+        if any(x[1] in predicates for x in added | removed):
+            return True
+        new_counts = Counter(x[0] for x in added)
+        for subject in set(x[0] for x in added | removed):
+            term = self.terms[subject]
+            if not isinstance(term, URIRef):
+                continue
+            # A term whose triples are all new, or that has none left, came or went.
+            count = sum(1 for _ in self.compact.triples((term, None, None)))
+            if count == 0 or count == new_counts[subject]:
+                return True
+        return False
+
+    def full_load(self, document, keys):
+        self.graph = ConjunctiveGraph()
+        self.entries = {}
+        self.counts = Counter()
+        self.terms = []
+        self.ids = {}
+        self.document = document
+        self.touched = None
+        self.reshaped = True
+        self.compact = None
+        try:
+            if not isinstance(document, dict) or '@id' not in document:
+                raise UnsupportedDocument('no top-level @id')
+            self.loader = DirectLoader(document, self.graph.absolutize(''))
+            top = dict(document)
+            del top['@context']
+            top.pop('defines', None)
+            self.loader.node(top)
+            self.add(self.intern(self.loader.triples))
+            for key, entry in zip(keys, document.get('defines', []) or []):
+                triples = self.entry_triples(entry)
+                self.entries.setdefault(key, []).append(triples)
+                self.add(triples)
+        except UnsupportedDocument:
+            self.loader = None
+            self.graph = load_ontology(self.filename, cache=False).graph
+            return
+        for name, namespace in self.loader.namespaces():
+            self.graph.bind(name, namespace)
+
+    def update(self, document):
+        """Bring the graph up to document."""
+        entries = document.get('defines', []) or [] if isinstance(document, dict) else []
+        keys = [canonical(x) for x in entries]
+        if self.loader is None or not isinstance(document, dict) or self.head(document) != self.head(self.document):
+            self.full_load(document, keys)
+        else:
+            self.touched = set()
+            self.added, self.removed = [], []
+            old = Counter({key: len(triples) for key, triples in self.entries.items()})
+            new = Counter(keys)
+            by_key = dict(zip(keys, entries))
+            for key, count in (old - new).items():
+                for _ in range(count):
+                    triples = self.entries[key].pop()
+                    self.remove(triples)
+                    self.touch(triples)
+                if not self.entries[key]:
+                    del self.entries[key]
+            self.document = document
+            for key, count in (new - old).items():
+                for _ in range(count):
+                    triples = self.entry_triples(by_key[key])
+                    self.entries.setdefault(key, []).append(triples)
+                    self.add(triples)
+                    self.touch(triples)
+            # An edited entry has its unchanged triples removed and added again.
+            added, removed = set(self.added) - set(self.removed), set(self.removed) - set(self.added)
+            self.added, self.removed = [], []
+            if self.compact is None:
+                self.reshaped = True
+            else:
+                self.compact.update(added, removed)
+                self.reshaped = self.is_reshaping(added, removed)
+        key_of = {id(entry): key for entry, key in zip(entries, keys)}
+        sources = {}
+
+        def normalise(entry):
+            key = key_of[id(entry)]
+            source = sources[key] = self.sources.get(key) or normalise_entry(entry)
+            return source
+        self.defines = index_defines(document, normalise)
+        self.sources = sources
+
+    def reload(self):
+        """Read the file again; False if its content did not change."""
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        if data == self.data:
+            return False
+        self.update(json.loads(data.decode('utf-8')))
+        self.data = data
+        return True
+
+
+class Watcher:
+    """
+    Regenerates the documents of filename whenever it or settings.conf
+    changes, keeping the ontology in memory and rendering only the classes
+    whose fingerprint (see incremental.Fingerprinter) changed. The output
+    tree and its manifest are the same as generate.py -i writes.
+
+    The prepared graph, its indexes and the class fingerprints are kept
+    between passes; an edit updates what was derived from the terms it
+    touched, and only an edit that reshapes the ontology rebuilds them.
+    """
+
+    def __init__(self, filename, jobs=1, link=None, interval=0.2):
+        self.filename = filename
+        self.jobs = jobs
+        self.link = link
+        self.interval = interval
+        self.context_name = os.path.splitext(filename)[0]
+        self.result_dir_name = os.path.join('newres', self.context_name)
+        self.ontology = HotOntology(filename)
+        self.manifest = Manifest.load(self.result_dir_name + '.manifest.json')
+        self.settings = None
+        self.digests = {}
+        self.graph = None
+        self.fingerprints = {}
+        self.stats = {}
+
+    def stat(self):
+        result = {}
+        for path in (self.filename, CONF_NAME):
+            try:
+                st = os.stat(path)
+                result[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                result[path] = None
+        return result
+
+    def regenerate(self):
+        """One pass; returns (rendered, total) class counts."""
+        with open(CONF_NAME, encoding='utf-8') as f:
+            settings = json.load(f)
+        changed = self.ontology.reload()
+        if not changed and settings == self.settings:
+            return 0, len(self.manifest.classes)
+        touched = self.ontology.touched
+        # Taken over until the pass completes, so a failed pass starts the next one afresh.
+        graph, self.graph = self.graph, None
+        previous, self.fingerprints = self.fingerprints, {}
+        if graph is None or touched is None:
+            self.digests = {}
+            previous = {}
+            graph = prepare_graph(self.ontology.graph, compact=True, store=self.ontology.store)
+        elif changed:
+            for term in touched:
+                self.digests.pop(term, None)
+            update_graph(graph, touched, self.ontology.reshaped)
+            if self.ontology.reshaped:
+                previous = {}
+        stale = set(touched) if changed and touched else set()
+        defines = self.ontology.defines
+        all_classes, top_classes = collect_classes(graph)
+        settings_fp = settings_fingerprint(settings, graph)
+        if settings_fp != self.manifest.settings:
+            previous = {}
+        new_manifest = Manifest(self.manifest.path, settings_fp)
+        fingerprinter = Fingerprinter(graph, defines, settings_fp, self.digests)
+        fingerprints = {}
+        classes_to_render = []
+        for current_class in all_classes:
+            name = str(current_class)
+            if name in fingerprints:
+                continue
+            fingerprint = previous.get(name)
+            if fingerprint is None or fingerprinter.depends_on(current_class, stale):
+                fingerprint = fingerprinter.fingerprint(current_class)
+            fingerprints[name] = fingerprint
+            if self.manifest.settings == settings_fp and self.manifest.is_fresh(name, fingerprints[name]):
+                new_manifest.classes[name] = self.manifest.classes[name]
+            else:
+                classes_to_render.append(current_class)
+        with DirectorySink(link=self.link) as sink:
+            rendered_classes = render_classes(classes_to_render, settings, defines, self.context_name, self.result_dir_name, jobs=self.jobs)
+            for current_class, rendered in zip(classes_to_render, rendered_classes):
+                sink.write_rendered(rendered)
+                new_manifest.update(str(current_class), fingerprints[str(current_class)], rendered)
+            remove_stale(self.manifest, new_manifest, self.result_dir_name)
+            new_manifest.save()
+            self.manifest = new_manifest
+            context_file_path = os.path.join(self.result_dir_name, 'Vocabulary.jsonld')
+            sink.write(context_file_path, dump_json(create_identity_directory_from_rdf_class(top_classes, context_file_path)))
+        self.settings = settings
+        self.graph = graph
+        self.fingerprints = fingerprints
+        return len(classes_to_render), len(fingerprints)
+
+    def run_once(self):
+        started = time.perf_counter()
+        try:
+            rendered, total = self.regenerate()
+        except (OSError, ValueError) as e:
+            # Usually a file caught halfway through saving; the next change retries.
+            print('Not regenerated: {}'.format(e), file=sys.stderr)
+            return False
+        print('Regenerated {} of {} classes in {:.3f}s'.format(rendered, total, time.perf_counter() - started), file=sys.stderr)
+        return True
+
+    def run(self):
+        self.stats = self.stat()
+        self.run_once()
+        while True:
+            time.sleep(self.interval)
+            stats = self.stat()
+            if stats == self.stats:
+                continue
+            self.stats = stats
+            self.run_once()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Keep regenerating newres while the ontology or settings.conf change.')
+    parser.add_argument('filename', help='ontology to watch, e.g. pot.jsonld')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes used for rendering')
+    parser.add_argument('--link', choices=('hardlink', 'symlink'), help='link documents of classes with several parents instead of writing copies')
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between checks for changes')
+    parser.add_argument('--once', action='store_true', help='regenerate once and exit, e.g. to check the result')
+    args = parser.parse_args()
+    watcher = Watcher(args.filename, jobs=args.jobs, link=args.link, interval=args.interval)
+    try:
+        if args.once:
+            sys.exit(0 if watcher.run_once() else 1)
+        watcher.run()
+    except KeyboardInterrupt:
+        pass